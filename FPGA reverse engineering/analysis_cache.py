@@ -0,0 +1,69 @@
+from typing import Any, Dict, Optional
+import hashlib
+import json
+import os
+import pathlib
+
+import numpy as np
+
+
+# Bump whenever the cached analysis changes meaning, so stale entries are never reused
+CACHE_VERSION = 7
+
+
+class AnalysisCache:
+    """
+    On-disk store of HWCircuit analysis results, keyed by the content hash of the verilog source and gate library.
+    Every key holds a json entry plus optional numpy tables next to it:
+        <cache_dir>/<key>.json
+        <cache_dir>/<key>.<table name>.npy
+    """
+
+    def __init__(self, cache_dir: pathlib.Path) -> None:
+        self.cache_dir = pathlib.Path(cache_dir)
+
+    @staticmethod
+    def get_key(*paths: pathlib.Path, salt: str = "") -> str:
+        """
+        salt separates entries produced from the same files by different means (e.g. netlist backends).
+        """
+        digest = hashlib.sha256(f"hwcircuit-cache-v{CACHE_VERSION}:{salt}".encode())
+        for path in paths:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+            digest.update(b"\0")
+
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> pathlib.Path:
+        return self.cache_dir / f"{key}.json"
+
+    def _table_path(self, key: str, name: str) -> pathlib.Path:
+        return self.cache_dir / f"{key}.{name}.npy"
+
+    def _write_atomically(self, path: pathlib.Path, write) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(temp_path, "wb") as f:
+            write(f)
+        os.replace(temp_path, path)
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._entry_path(key), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store(self, key: str, entry: Dict[str, Any]) -> None:
+        self._write_atomically(self._entry_path(key), lambda f: f.write(json.dumps(entry).encode()))
+
+    def load_table(self, key: str, name: str) -> Optional[np.ndarray]:
+        try:
+            return np.load(self._table_path(key, name), allow_pickle=False)
+        except (OSError, ValueError):
+            return None
+
+    def store_table(self, key: str, name: str, table: np.ndarray) -> None:
+        self._write_atomically(self._table_path(key, name), lambda f: np.save(f, table, allow_pickle=False))
@@ -0,0 +1,292 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import re
+
+
+# Expression nodes are plain tuples so they can be hashed, cached and sent to worker processes:
+#   (CONST, 0 | 1), (VAR, name), (NOT, operand), (AND | OR | XOR, (operand, operand, ...))
+# Composed cone functions share sub-expressions, so traversals memoize on id(node) rather than hashing
+# (potentially huge) nested tuples.
+CONST = "const"
+VAR = "var"
+NOT = "not"
+AND = "and"
+OR = "or"
+XOR = "xor"
+
+Expr = Tuple
+
+CONSTANT_TOKENS = {"0": 0, "1": 1, "0b0": 0, "0b1": 1, "'0'": 0, "'1'": 1}
+# lowest to highest binding operator
+BINARY_OPERATORS = ((OR, "|"), (XOR, "^"), (AND, "&"))
+
+_TOKEN_RE = re.compile(r"\s*(?:([()!~&|^])|([^\s()!~&|^]+))")
+
+
+class BooleanExprException(Exception):
+    pass
+
+
+def _tokenize(text: str) -> List[str]:
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN_RE.match(text, position)
+        if match is None:
+            raise BooleanExprException(f"Unexpected character at {position}: {text[position:]!r}")
+        tokens.append(match.group(1) or match.group(2))
+        position = match.end()
+
+    return tokens
+
+
+class _Group:
+    """
+    A parenthesized group being parsed: the operand lists of the open OR / XOR / AND chains (one per
+    BINARY_OPERATORS precedence), plus the negations written in front of the group.
+    """
+
+    def __init__(self, negations: int = 0) -> None:
+        self.chains: List[List[Expr]] = [[] for _ in BINARY_OPERATORS]
+        self.negations = negations
+
+    def close_chains(self, precedence: int) -> None:
+        """
+        Folds the chains binding tighter than precedence into single operands of the chain at precedence.
+        """
+        for level in range(len(BINARY_OPERATORS) - 1, precedence, -1):
+            operands = self.chains[level]
+            self.chains[level] = []
+            self.chains[level - 1].append(
+                operands[0] if len(operands) == 1 else (BINARY_OPERATORS[level][0], tuple(operands))
+            )
+
+    def close(self) -> Expr:
+        self.close_chains(0)
+        operands = self.chains[0]
+        expr = operands[0] if len(operands) == 1 else (BINARY_OPERATORS[0][0], tuple(operands))
+        for _ in range(self.negations):
+            expr = negate(expr)
+
+        return expr
+
+
+def _parse_leaf(token: str, variables: Optional[Set[str]]) -> Expr:
+    # variables take precedence over constants: HAL names nets by id, so "1" may well be a net
+    if variables is not None:
+        if token in variables:
+            return (VAR, token)
+    elif token not in CONSTANT_TOKENS:
+        return (VAR, token)
+    if token in CONSTANT_TOKENS:
+        return (CONST, CONSTANT_TOKENS[token])
+
+    raise BooleanExprException(f"Unknown variable {token!r}")
+
+
+def parse(text: str, variables: Optional[Iterable[str]] = None) -> Expr:
+    """
+    Parses the textual form of a boolean function, as printed by hal_py.BooleanFunction and the gate library
+    cell functions ("!", "~", "&", "^", "|" and parentheses).
+    When variables is given, only those names are accepted as variables.
+    Parentheses are tracked on an explicit stack, so arbitrarily deeply nested functions parse fine.
+    """
+    variables = None if variables is None else set(variables)
+    precedences = {symbol: precedence for precedence, (_, symbol) in enumerate(BINARY_OPERATORS)}
+    groups = [_Group()]
+    negations = 0                                       # pending "!" in front of the next operand
+    expect_operand = True
+    for token in _tokenize(text):
+        if expect_operand:
+            if token in ("!", "~"):
+                negations += 1
+            elif token == "(":
+                groups.append(_Group(negations))
+                negations = 0
+            elif token == ")" or token in precedences:
+                raise BooleanExprException(f"Unexpected {token!r}")
+            else:
+                expr = _parse_leaf(token, variables)
+                for _ in range(negations):
+                    expr = negate(expr)
+                negations = 0
+                groups[-1].chains[-1].append(expr)
+                expect_operand = False
+        elif token in precedences:
+            groups[-1].close_chains(precedences[token])
+            expect_operand = True
+        elif token == ")":
+            if len(groups) == 1:
+                raise BooleanExprException("Unbalanced ')'")
+            expr = groups.pop().close()
+            groups[-1].chains[-1].append(expr)
+        else:
+            raise BooleanExprException(f"Trailing tokens in expression at {token!r}")
+
+    if expect_operand:
+        raise BooleanExprException("Unexpected end of expression")
+    if len(groups) > 1:
+        raise BooleanExprException("Expected ')'")
+
+    return groups[0].close()
+
+
+def negate(expr: Expr) -> Expr:
+    if expr[0] == CONST:
+        return (CONST, 1 - expr[1])
+    if expr[0] == NOT:
+        return expr[1]
+    return (NOT, expr)
+
+
+def get_variables(expr: Expr) -> List[str]:
+    """
+    The variables of expr in first-occurrence (left to right) order.
+    """
+    variables = {}
+    visited = set()
+    stack = [expr]
+    while stack:
+        node = stack.pop()
+        if id(node) in visited:
+            continue
+        visited.add(id(node))
+        if node[0] == VAR:
+            variables.setdefault(node[1], None)
+        elif node[0] == NOT:
+            stack.append(node[1])
+        elif node[0] != CONST:
+            stack.extend(reversed(node[1]))
+
+    return list(variables)
+
+
+def _post_order(expr: Expr) -> Iterator[Expr]:
+    """
+    Every distinct node of expr (by identity) once, operands before the nodes using them. Iterative, so deep
+    cones do not hit the recursion limit.
+    """
+    visited: Set[int] = set()
+    stack = [(expr, False)]
+    while stack:
+        node, operands_ready = stack.pop()
+        if id(node) in visited:
+            continue
+        kind = node[0]
+        if kind in (CONST, VAR) or operands_ready:
+            visited.add(id(node))
+            yield node
+            continue
+        stack.append((node, True))
+        stack.extend((operand, False) for operand in ((node[1],) if kind == NOT else node[1]))
+
+
+def substitute(expr: Expr, replacements: Dict[str, Expr]) -> Expr:
+    """
+    Replaces variables by expressions, e.g. the pins of a cell function by the functions driving them.
+    """
+    results: Dict[int, Expr] = {}                       # id(node) -> substituted node
+    for node in _post_order(expr):
+        kind = node[0]
+        if kind == CONST:
+            results[id(node)] = node
+        elif kind == VAR:
+            results[id(node)] = replacements.get(node[1], node)
+        elif kind == NOT:
+            results[id(node)] = negate(results[id(node[1])])
+        else:
+            results[id(node)] = (kind, tuple(results[id(operand)] for operand in node[1]))
+
+    return results[id(expr)]
+
+
+def evaluate(expr: Expr, assignment: Dict[str, int]) -> int:
+    values: Dict[int, int] = {}                         # id(node) -> value
+    for node in _post_order(expr):
+        kind = node[0]
+        if kind == CONST:
+            values[id(node)] = node[1]
+        elif kind == VAR:
+            values[id(node)] = assignment[node[1]]
+        elif kind == NOT:
+            values[id(node)] = 1 - values[id(node[1])]
+        else:
+            operands = [values[id(operand)] for operand in node[1]]
+            if kind == AND:
+                values[id(node)] = int(all(operands))
+            elif kind == OR:
+                values[id(node)] = int(any(operands))
+            else:
+                values[id(node)] = sum(operands) & 1
+
+    return values[id(expr)]
+
+
+def to_table(exprs: List[Expr]) -> Tuple[List[List], List[int]]:
+    """
+    Flattens expressions into a node table plus the row of every root, sharing one row per distinct node, so
+    reconvergent cones stay linear in size. Rows are [kind, value], where value is the constant, the variable name,
+    the operand row (NOT) or the list of operand rows; operands always come before the rows using them.
+    """
+    rows: Dict[int, int] = {}                           # id(node) -> row
+    table: List[List] = []
+    for expr in exprs:
+        stack = [(expr, False)]
+        while stack:
+            node, operands_ready = stack.pop()
+            if id(node) in rows:
+                continue
+            kind = node[0]
+            if kind in (CONST, VAR):
+                rows[id(node)] = len(table)
+                table.append([kind, node[1]])
+                continue
+            operands = (node[1],) if kind == NOT else node[1]
+            if not operands_ready:
+                stack.append((node, True))
+                stack.extend((operand, False) for operand in operands)
+                continue
+            rows[id(node)] = len(table)
+            if kind == NOT:
+                table.append([kind, rows[id(node[1])]])
+            else:
+                table.append([kind, [rows[id(operand)] for operand in operands]])
+
+    return table, [rows[id(expr)] for expr in exprs]
+
+
+def from_table(table: List[List], roots: List[int]) -> List[Expr]:
+    """
+    The inverse of to_table: rebuilds the expressions, with shared rows becoming shared nodes again.
+    """
+    nodes: List[Expr] = []
+    for kind, value in table:
+        if kind in (CONST, VAR):
+            nodes.append((kind, value))
+        elif kind == NOT:
+            nodes.append((NOT, nodes[value]))
+        else:
+            nodes.append((kind, tuple(nodes[row] for row in value)))
+
+    return [nodes[root] for root in roots]
+
+
+def to_string(expr: Expr) -> str:
+    """
+    The textual form parse() reads back. Shared sub-expressions are written out at every use, so the text can be
+    far larger than the expression; to_table() is the compact form.
+    """
+    symbols = dict(BINARY_OPERATORS)
+    texts: Dict[int, str] = {}                          # id(node) -> text
+    for node in _post_order(expr):
+        kind = node[0]
+        if kind == CONST:
+            texts[id(node)] = str(node[1])
+        elif kind == VAR:
+            texts[id(node)] = node[1]
+        elif kind == NOT:
+            texts[id(node)] = f"!{texts[id(node[1])]}"
+        else:
+            texts[id(node)] = "(" + f" {symbols[kind]} ".join(texts[id(operand)] for operand in node[1]) + ")"
+
+    return texts[id(expr)]
@@ -0,0 +1,283 @@
+from typing import Any, Dict, List, Optional, Tuple
+from multiprocessing.connection import Connection, wait
+import argparse
+import json
+import multiprocessing
+import os
+import pathlib
+import time
+import traceback
+
+import numpy as np
+
+from netlist_backends import NETLIST_BACKENDS
+from project3_solution import ANALYSIS_CACHE_DIR, GATES_LIB_PATH, HWCircuit
+
+
+BATCH_OUTPUT_DIR = pathlib.Path(os.getcwd()) / "fsm_batch_output"
+VERILOG_SUFFIXES = (".v", ".vg")
+DEFAULT_TIMEOUT = 600.0
+
+
+class FsmBatchException(Exception):
+    pass
+
+
+def find_designs(source: pathlib.Path) -> List[pathlib.Path]:
+    """
+    source is either a directory (every verilog file in it is a design) or a manifest file listing one netlist path
+    per line. Manifest paths are relative to the manifest itself, and '#' starts a comment.
+    """
+    source = pathlib.Path(source)
+    if source.is_dir():
+        return sorted(path for path in source.iterdir() if path.suffix in VERILOG_SUFFIXES)
+
+    designs = []
+    with open(source, "r") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                path = pathlib.Path(line)
+                designs.append(path if path.is_absolute() else source.parent / path)
+
+    return designs
+
+
+def _get_design_names(designs: List[pathlib.Path]) -> List[str]:
+    # designs from different directories may share a file name, but every one needs its own output directory
+    names = []
+    seen_names: Dict[str, int] = {}
+    for design in designs:
+        count = seen_names.get(design.stem, 0)
+        seen_names[design.stem] = count + 1
+        names.append(design.stem if count == 0 else f"{design.stem}_{count}")
+
+    return names
+
+
+def analyse_design(
+        verilog_source_path: pathlib.Path,
+        design_output_dir: pathlib.Path,
+        options: Dict[str, Any],
+) -> Dict[str, Any]:
+    """
+    Runs the HWCircuit pipeline on a single design and writes its states diagram (json, or the integer states table
+    as npy with the enumerate engine), DOT graph and metrics into design_output_dir. Returns the metrics.
+    """
+    design_output_dir.mkdir(parents=True, exist_ok=True)
+    metrics: Dict[str, Any] = {"design": str(verilog_source_path), "netlist_bytes": verilog_source_path.stat().st_size}
+
+    start = time.perf_counter()
+    circuit = HWCircuit(
+        verilog_source_path,
+        options["gates_lib_path"],
+        states_engine=options["states_engine"],
+        cache_dir=options["cache_dir"],
+        backend=options["backend"],
+        verbose=False,
+        candidates_to_analyse=options["candidates_to_analyse"],
+        # the batch already runs one process per design, and only that process is terminated on timeout: a
+        # candidate pool of its own would be left running
+        candidate_workers=1,
+    )
+    metrics["analysis_seconds"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if circuit.states_table is not None:
+        # 2^(flip-flops + inputs) transitions, which are never turned into strings (see HWCircuit.states_diagram)
+        np.save(design_output_dir / "states_table.npy", circuit.states_table)
+    else:
+        with open(design_output_dir / "states_diagram.json", "w") as f:
+            json.dump([[state, input, next_state] for (state, input), next_state in circuit.states_diagram.items()], f)
+    circuit.print_graph(design_output_dir / "states_diagram.dot")
+    metrics["output_seconds"] = time.perf_counter() - start
+
+    metrics.update({
+        "backend": circuit.backend_name,
+        "states_engine": circuit.states_engine,
+        "cache_hit": circuit.cache_hit,
+        "fsm_gates": len(circuit.fsm_gate_ids),
+        "flipflops": len(circuit.next_state_exprs),
+        "inputs": len(circuit.input_nets),
+        "states": circuit.get_states_count(),
+        "transitions": circuit.get_transitions_count(),
+        "fsm_candidates": circuit.candidate_reports,
+    })
+
+    return metrics
+
+
+def _design_worker(
+        connection: Connection,
+        verilog_source_path: pathlib.Path,
+        design_output_dir: pathlib.Path,
+        options: Dict[str, Any],
+) -> None:
+    try:
+        result = {"status": "ok", **analyse_design(verilog_source_path, design_output_dir, options)}
+    except Exception as e:
+        result = {"status": "error", "error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()}
+    connection.send(result)
+    connection.close()
+
+
+class FsmBatch:
+    """
+    Reverse engineers the FSMs of many netlists, every design in its own worker process with at most jobs running at
+    once. A design that exceeds its timeout has its worker terminated and is reported as such, without holding
+    back the rest of the batch.
+    Output layout:
+        <output_dir>/<design>/states_diagram.json       (symbolic engine)
+        <output_dir>/<design>/states_table.npy          (enumerate engine, see HWCircuit.get_states_table)
+        <output_dir>/<design>/states_diagram.dot
+        <output_dir>/<design>/metrics.json
+        <output_dir>/summary.json
+        <output_dir>/summary.txt
+    """
+
+    def __init__(
+            self,
+            designs: List[pathlib.Path],
+            output_dir: pathlib.Path = BATCH_OUTPUT_DIR,
+            gates_lib_path: pathlib.Path = GATES_LIB_PATH,
+            jobs: Optional[int] = None,
+            timeout: float = DEFAULT_TIMEOUT,
+            states_engine: str = "symbolic",
+            backend: str = "auto",
+            cache_dir: Optional[pathlib.Path] = ANALYSIS_CACHE_DIR,
+            candidates_to_analyse: int = 1,
+    ) -> None:
+        if not designs:
+            raise FsmBatchException("No netlists to analyse")
+        self.designs: List[pathlib.Path] = [pathlib.Path(design) for design in designs]
+        self.design_names: List[str] = _get_design_names(self.designs)
+        self.output_dir: pathlib.Path = pathlib.Path(output_dir)
+        self.jobs: int = jobs if jobs is not None else os.cpu_count() or 1
+        self.timeout: float = timeout
+        self.options: Dict[str, Any] = {
+            "gates_lib_path": pathlib.Path(gates_lib_path),
+            "states_engine": states_engine,
+            "backend": backend,
+            "cache_dir": cache_dir,
+            "candidates_to_analyse": candidates_to_analyse,
+        }
+
+    def _start_worker(self, design_index: int) -> Tuple[multiprocessing.Process, Connection]:
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(
+            target=_design_worker,
+            args=(sender, self.designs[design_index], self.output_dir / self.design_names[design_index], self.options),
+        )
+        process.start()
+        # the child owns the sending end now; closing ours lets recv() see EOF if the child dies
+        sender.close()
+
+        return process, receiver
+
+    def _finish_design(self, design_index: int, result: Dict[str, Any], elapsed: float) -> Dict[str, Any]:
+        result.setdefault("design", str(self.designs[design_index]))
+        result["name"] = self.design_names[design_index]
+        result["elapsed_seconds"] = elapsed
+        design_output_dir = self.output_dir / self.design_names[design_index]
+        design_output_dir.mkdir(parents=True, exist_ok=True)
+        with open(design_output_dir / "metrics.json", "w") as f:
+            json.dump(result, f, indent=2)
+        print(f'[{result["status"]}] {result["name"]} ({elapsed:.1f}s)')
+
+        return result
+
+    def run(self) -> List[Dict[str, Any]]:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(self.designs)
+        pending = list(range(len(self.designs)))
+        # receiving connection -> (design index, process, start time)
+        running: Dict[Connection, Tuple[int, multiprocessing.Process, float]] = {}
+
+        while pending or running:
+            while pending and len(running) < self.jobs:
+                design_index = pending.pop(0)
+                process, receiver = self._start_worker(design_index)
+                running[receiver] = (design_index, process, time.perf_counter())
+
+            now = time.perf_counter()
+            next_deadline = min(started + self.timeout for _, _, started in running.values())
+            for receiver in wait(list(running), timeout=max(0.0, next_deadline - now)):
+                design_index, process, started = running.pop(receiver)
+                try:
+                    result = receiver.recv()
+                except EOFError:
+                    result = {"status": "crashed"}
+                receiver.close()
+                process.join()
+                if result["status"] == "crashed":
+                    result["error"] = f"Worker exited with code {process.exitcode}"
+                results[design_index] = self._finish_design(design_index, result, time.perf_counter() - started)
+
+            now = time.perf_counter()
+            for receiver, (design_index, process, started) in list(running.items()):
+                if now - started >= self.timeout:
+                    process.terminate()
+                    process.join()
+                    receiver.close()
+                    del running[receiver]
+                    result = {"status": "timeout", "error": f"Exceeded the {self.timeout}s timeout"}
+                    results[design_index] = self._finish_design(design_index, result, now - started)
+
+        self.write_summary(results)
+
+        return results
+
+    def write_summary(self, results: List[Dict[str, Any]]) -> None:
+        with open(self.output_dir / "summary.json", "w") as f:
+            json.dump(results, f, indent=2)
+
+        columns = ("name", "status", "elapsed_seconds", "flipflops", "inputs", "states", "transitions", "cache_hit")
+        rows = [columns] + [
+            tuple(f"{result[column]:.2f}" if isinstance(result.get(column), float) else str(result.get(column, "-"))
+                  for column in columns)
+            for result in results
+        ]
+        widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+        lines = ["  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() for row in rows]
+        succeeded = sum(result["status"] == "ok" for result in results)
+        lines.append("")
+        lines.append(f"{succeeded}/{len(results)} designs analysed successfully")
+        for result in results:
+            if result["status"] != "ok":
+                lines.append(f'{result["name"]}: {result["status"]} - {result.get("error", "")}')
+
+        with open(self.output_dir / "summary.txt", "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reverse engineer the FSMs of a batch of netlists")
+    parser.add_argument("source", type=pathlib.Path, help="Directory of verilog netlists, or a manifest listing them")
+    parser.add_argument("-o", "--output-dir", type=pathlib.Path, default=BATCH_OUTPUT_DIR)
+    parser.add_argument("-l", "--gates-lib", type=pathlib.Path, default=GATES_LIB_PATH)
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("-t", "--timeout", type=float, default=DEFAULT_TIMEOUT, help="Per design timeout in seconds")
+    parser.add_argument("--engine", choices=HWCircuit.STATES_ENGINES, default="symbolic")
+    parser.add_argument("--backend", choices=("auto", *NETLIST_BACKENDS), default="auto")
+    parser.add_argument("--cache-dir", type=pathlib.Path, default=ANALYSIS_CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("-k", "--candidates", type=int, default=1, help="FSM candidates (SCCs) to analyse per design")
+    args = parser.parse_args()
+
+    batch = FsmBatch(
+        find_designs(args.source),
+        output_dir=args.output_dir,
+        gates_lib_path=args.gates_lib,
+        jobs=args.jobs,
+        timeout=args.timeout,
+        states_engine=args.engine,
+        backend=args.backend,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        candidates_to_analyse=args.candidates,
+    )
+    batch.run()
+    print(f'Summary written to {batch.output_dir / "summary.txt"}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import boolean_expr
+from boolean_expr import Expr
+
+
+WORD_BITS = 64
+WORD_BITS_LOG = 6
+ONES = np.uint64(0xFFFFFFFFFFFFFFFF)
+ZERO = np.uint64(0)
+# LANE_PATTERNS[p] has bit l set iff bit p of l is set, i.e. the value of assignment bit p in each of 64 lanes
+LANE_PATTERNS = [
+    np.uint64(sum(1 << lane for lane in range(WORD_BITS) if (lane >> position) & 1))
+    for position in range(WORD_BITS_LOG)
+]
+
+
+class FsmBitParallelException(Exception):
+    pass
+
+
+def compile_exprs(exprs: List[Expr], variable_slots: Dict[str, int]) -> Callable:
+    """
+    Compiles expressions into one straight-line function f(v) -> tuple of results, where v[slot] holds the packed
+    lanes of a variable. Every distinct sub-expression is computed once, and the code contains no nesting, so
+    arbitrarily deep cones compile fine.
+    """
+    lines = ["def _next_state(v):"]
+    temporaries: Dict[int, str] = {}                    # id(node) -> python expression of its packed value
+
+    def emit(expr: Expr) -> str:
+        stack = [(expr, False)]
+        while stack:
+            node, operands_ready = stack.pop()
+            if id(node) in temporaries:
+                continue
+            kind = node[0]
+            if kind == boolean_expr.CONST:
+                temporaries[id(node)] = "ONES" if node[1] else "ZERO"
+                continue
+            if kind == boolean_expr.VAR:
+                temporaries[id(node)] = f"v[{variable_slots[node[1]]}]"
+                continue
+            operands = (node[1],) if kind == boolean_expr.NOT else node[1]
+            if not operands_ready:
+                stack.append((node, True))
+                stack.extend((operand, False) for operand in operands)
+                continue
+
+            name = f"t{len(temporaries)}"
+            if kind == boolean_expr.NOT:
+                lines.append(f"    {name} = ~{temporaries[id(operands[0])]}")
+            else:
+                symbol = dict(boolean_expr.BINARY_OPERATORS)[kind]
+                lines.append(f"    {name} = " + f" {symbol} ".join(temporaries[id(operand)] for operand in operands))
+            temporaries[id(node)] = name
+
+        return temporaries[id(expr)]
+
+    results = [emit(expr) for expr in exprs]
+    lines.append(f"    return ({', '.join(results)},)")
+    namespace = {"ONES": ONES, "ZERO": ZERO}
+    exec(compile("\n".join(lines), "<fsm_bitparallel>", "exec"), namespace)
+
+    return namespace["_next_state"]
+
+
+class BitParallelFsm:
+    """
+    Exhaustive (state, input) evaluation of FSM next-state functions, 64 assignments per uint64 word and
+    2^batch_bits assignments per numpy batch.
+    Assignment a encodes the state in its high bits and the inputs in its low bits, both MSB first like the
+    strings of HWCircuit.get_states_diagram, i.e. a = int(state, 2) << len(inputs) | int(input, 2).
+    """
+
+    def __init__(
+            self,
+            state_nets: List[Tuple[Optional[str], Optional[str]]],
+            input_nets: List[str],
+            next_state_exprs: List[Expr],
+            batch_bits: int = 20,
+    ) -> None:
+        if len(state_nets) != len(next_state_exprs):
+            raise FsmBitParallelException("Every flip-flop needs exactly one next state function")
+        if len(state_nets) > 64:
+            raise FsmBitParallelException("States wider than 64 bits cannot be tabulated")
+
+        self.states_length: int = len(state_nets)
+        self.inputs_length: int = len(input_nets)
+        self.assignment_bits: int = self.states_length + self.inputs_length
+        self.batch_bits: int = max(WORD_BITS_LOG, min(batch_bits, self.assignment_bits))
+
+        # variable slot == bit position in the assignment; QN nets get their own slots after all positions
+        variable_slots = {}
+        for i, net in enumerate(input_nets):
+            variable_slots[net] = self.inputs_length - 1 - i
+        self.negated_slots: List[Tuple[int, int]] = []
+        for i, (q_net, q_not_net) in enumerate(state_nets):
+            position = self.inputs_length + self.states_length - 1 - i
+            if q_net is not None:
+                variable_slots[q_net] = position
+            if q_not_net is not None:
+                variable_slots[q_not_net] = self.assignment_bits + len(self.negated_slots)
+                self.negated_slots.append((variable_slots[q_not_net], position))
+
+        self._evaluate = compile_exprs(next_state_exprs, variable_slots)
+
+    def _batch_variables(self, base: int, words: int) -> List[np.ndarray]:
+        word_index = np.arange(words, dtype=np.uint64)
+        variables = []
+        for position in range(self.assignment_bits):
+            if position < WORD_BITS_LOG:
+                variables.append(np.full(words, LANE_PATTERNS[position], dtype=np.uint64))
+            elif position < self.batch_bits:
+                word_bit = (word_index >> np.uint64(position - WORD_BITS_LOG)) & np.uint64(1)
+                variables.append(np.where(word_bit == 1, ONES, ZERO))
+            else:
+                variables.append(np.full(words, ONES if (base >> position) & 1 else ZERO, dtype=np.uint64))
+        for slot, position in self.negated_slots:
+            variables.append(~variables[position])
+
+        return variables
+
+    @staticmethod
+    def _unpack_lanes(packed: np.ndarray, lanes: int) -> np.ndarray:
+        packed = np.ascontiguousarray(packed, dtype="<u8")
+        return np.unpackbits(packed.view(np.uint8), bitorder="little")[:lanes]
+
+    def get_states_table(self) -> np.ndarray:
+        """
+        table[state, input] = next state, all as integers.
+        """
+        total = 1 << self.assignment_bits
+        lanes_per_batch = 1 << self.batch_bits
+        words = max(1, lanes_per_batch // WORD_BITS)
+        table = np.zeros(total, dtype=np.min_scalar_type((1 << max(self.states_length, 1)) - 1))
+
+        for base in range(0, total, lanes_per_batch):
+            lanes = min(lanes_per_batch, total - base)
+            results = self._evaluate(self._batch_variables(base, words))
+            next_states = table[base:base + lanes]
+            for i, packed in enumerate(results):
+                if not isinstance(packed, np.ndarray):                      # a constant next state function
+                    packed = np.full(words, packed, dtype=np.uint64)
+                bits = self._unpack_lanes(packed, lanes).astype(table.dtype)
+                next_states |= bits << (self.states_length - 1 - i)
+
+        return table.reshape(1 << self.states_length, 1 << self.inputs_length)
@@ -0,0 +1,157 @@
+from typing import Any, Dict, List, Optional, Set, Tuple
+import math
+
+import numpy as np
+
+import boolean_expr
+from fsm_bitparallel import BitParallelFsm
+from fsm_symbolic import SymbolicFsm
+from netlist_index import NetlistIndex
+
+
+# Controllers are small; SCCs with more state bits than this are most likely datapath loops (e.g. cipher rounds)
+MAX_CONTROLLER_FLIPFLOPS = 32
+DATAPATH_REGISTERS_WEIGHT = 2.0
+PRIMARY_INPUTS_WEIGHT = 1.0
+FLIPFLOPS_WEIGHT = 1.0
+FEEDBACK_DEPTH_WEIGHT = 0.1
+
+
+class FsmCandidate:
+    """
+    Structural features of one SCC of the gate graph, cheap to compute from the NetlistIndex alone:
+        flipflops: number of state bits
+        feedback_depth: the longest combinational path (in gates) inside the SCC from a flip-flop back to one
+        primary_inputs: global inputs read by the next state logic of the SCC flip-flops
+        datapath_registers: flip-flops outside the SCC fed by the SCC flip-flops (registers it controls)
+        unknown_gates: cells of unknown type (neither sequential nor combinational) feeding that next state logic
+    """
+
+    def __init__(self, gate_ids: List[int], index: NetlistIndex) -> None:
+        self.gate_ids: List[int] = gate_ids
+        gates = set(gate_ids)
+        flipflops = [gate_id for gate_id in gate_ids if index.is_sequential(gate_id)]
+        flipflop_output_nets = {net for gate_id in flipflops for net in index.gate_fan_out_nets[gate_id]}
+
+        self.flipflops: int = len(flipflops)
+        self.feedback_depth: int = self._get_feedback_depth(flipflops, gates, index)
+        self.primary_inputs: int = len(self._get_primary_inputs(flipflops, index))
+        self.datapath_registers: int = len(index.fan_out_flipflops(flipflop_output_nets) - gates)
+        self.unknown_gate_ids: Set[int] = {
+            gate_id
+            for flipflop in flipflops if flipflop in index.data_nets
+            for gate_id in index.fan_in_unknown_gates(index.data_nets[flipflop])
+        }
+
+    @staticmethod
+    def _get_feedback_depth(flipflops: List[int], gates: Set[int], index: NetlistIndex) -> int:
+        # depth of a net = gates on the longest path back to a flip-flop output / the SCC boundary, memoized per net
+        depths: Dict[int, int] = {}
+        on_path: Set[int] = set()
+        max_depth = 0
+        for gate_id in flipflops:
+            data_net = index.data_nets.get(gate_id)
+            if data_net is None:
+                continue
+            stack = [(data_net, False)]
+            while stack:
+                net, fan_in_ready = stack.pop()
+                if net in depths:
+                    continue
+                fan_in_nets = [
+                    fan_in_net
+                    for driver in index.net_sources.get(net, ())
+                    if driver in gates and index.is_combinational(driver)
+                    for fan_in_net in index.gate_fan_in_nets[driver]
+                ]
+                if not fan_in_ready:
+                    # a net met again while its own fan-in is being resolved closes a combinational loop; skip it
+                    if net in on_path:
+                        continue
+                    on_path.add(net)
+                    stack.append((net, True))
+                    stack.extend((fan_in_net, False) for fan_in_net in fan_in_nets if fan_in_net not in depths)
+                    continue
+                on_path.discard(net)
+                depths[net] = 1 + max((depths.get(fan_in_net, 0) for fan_in_net in fan_in_nets), default=-1)
+            max_depth = max(max_depth, depths[data_net])
+
+        return max_depth
+
+    @staticmethod
+    def _get_primary_inputs(flipflops: List[int], index: NetlistIndex) -> Set[int]:
+        primary_inputs = set()
+        for gate_id in flipflops:
+            data_net = index.data_nets.get(gate_id)
+            if data_net is None:
+                continue
+            if data_net in index.global_input_nets:
+                primary_inputs.add(data_net)
+            for cone_gate_id in index.fan_in_cone(data_net):
+                primary_inputs.update(
+                    net for net in index.gate_fan_in_nets[cone_gate_id] if net in index.global_input_nets
+                )
+
+        return primary_inputs
+
+    @property
+    def score(self) -> float:
+        """
+        Higher is more controller-like: a few state bits that read control inputs and steer many datapath
+        registers through shallow next state logic.
+        """
+        if self.flipflops == 0:
+            return -math.inf
+        score = (
+            DATAPATH_REGISTERS_WEIGHT * math.log2(1 + self.datapath_registers)
+            + PRIMARY_INPUTS_WEIGHT * math.log2(1 + self.primary_inputs)
+            - FLIPFLOPS_WEIGHT * math.log2(self.flipflops)
+            - FEEDBACK_DEPTH_WEIGHT * self.feedback_depth
+        )
+        if self.flipflops > MAX_CONTROLLER_FLIPFLOPS:
+            score -= self.flipflops - MAX_CONTROLLER_FLIPFLOPS
+
+        return score
+
+    def get_features(self) -> Dict[str, Any]:
+        return {
+            "gates": len(self.gate_ids),
+            "flipflops": self.flipflops,
+            "feedback_depth": self.feedback_depth,
+            "primary_inputs": self.primary_inputs,
+            "datapath_registers": self.datapath_registers,
+            "unknown_gates": sorted(self.unknown_gate_ids),
+            "score": self.score,
+        }
+
+
+def rank_fsm_candidates(scc_result: List[List[int]], index: NetlistIndex) -> List[FsmCandidate]:
+    """
+    Every SCC holding a flip-flop, best score first. Equal scores keep the old preference for the smallest SCC.
+    """
+    candidates = [
+        FsmCandidate(scc, index) for scc in scc_result
+        if len(scc) > 1 and any(index.is_sequential(gate_id) for gate_id in scc)
+    ]
+
+    return sorted(candidates, key=lambda candidate: (-candidate.score, len(candidate.gate_ids)))
+
+
+def analyse_fsm_candidate(
+        state_nets: List[Tuple[Optional[str], Optional[str]]],
+        input_nets: List[str],
+        next_state_table: Tuple[List[List], List[int]],
+        states_engine: str,
+        reset_state: str,
+) -> Tuple[Optional[Dict[Tuple[str, str], str]], Optional[np.ndarray]]:
+    """
+    The states diagram (symbolic engine) or states table (enumerate engine) of one candidate. Only plain data goes
+    in and out, so candidates can be analysed in worker processes. The next state functions come as the
+    boolean_expr.to_table node table: pickling the nested expression tuples of deep cones would hit the recursion
+    limit.
+    """
+    next_state_exprs = boolean_expr.from_table(*next_state_table)
+    if states_engine == "enumerate":
+        return None, BitParallelFsm(state_nets, input_nets, next_state_exprs).get_states_table()
+
+    return SymbolicFsm(state_nets, input_nets, next_state_exprs).get_states_diagram(reset_state), None
@@ -0,0 +1,288 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+from collections import deque
+
+import boolean_expr
+from boolean_expr import Expr
+
+
+FALSE = 0
+TRUE = 1
+
+
+class FsmSymbolicException(Exception):
+    pass
+
+
+class BDD:
+    """
+    A minimal reduced ordered binary decision diagram manager.
+    Nodes are ints indexing self.nodes, where each node is (level, low, high). The two terminals are 0 and 1 and
+    sit below every variable level.
+    """
+
+    def __init__(self, variable_order: List[str]) -> None:
+        self.variable_order: List[str] = list(variable_order)
+        self.levels: Dict[str, int] = {name: level for level, name in enumerate(self.variable_order)}
+        self.terminal_level: int = len(self.variable_order)
+        self.nodes: List[Tuple[int, int, int]] = [
+            (self.terminal_level, FALSE, FALSE),
+            (self.terminal_level, TRUE, TRUE),
+        ]
+        self._unique: Dict[Tuple[int, int, int], int] = {}
+        self._ite_cache: Dict[Tuple[int, int, int], int] = {}
+
+    def level(self, node: int) -> int:
+        return self.nodes[node][0]
+
+    def _make(self, level: int, low: int, high: int) -> int:
+        if low == high:
+            return low
+        key = (level, low, high)
+        node = self._unique.get(key)
+        if node is None:
+            node = len(self.nodes)
+            self.nodes.append(key)
+            self._unique[key] = node
+
+        return node
+
+    def var(self, name: str) -> int:
+        return self._make(self.levels[name], FALSE, TRUE)
+
+    def cofactors(self, node: int, level: int) -> Tuple[int, int]:
+        node_level, low, high = self.nodes[node]
+        if node_level != level:
+            return node, node
+        return low, high
+
+    def _ite_terminal_case(self, f: int, g: int, h: int) -> Optional[int]:
+        if f == TRUE:
+            return g
+        if f == FALSE:
+            return h
+        if g == h:
+            return g
+        if g == TRUE and h == FALSE:
+            return f
+        return self._ite_cache.get((f, g, h))
+
+    def ite(self, f: int, g: int, h: int) -> int:
+        """
+        if f then g else h. Shannon expansion on an explicit stack (deep BDDs would overflow the recursion limit),
+        with every (f, g, h) computed once.
+        """
+        result = self._ite_terminal_case(f, g, h)
+        if result is not None:
+            return result
+
+        results: List[int] = []
+        # (f, g, h, top level) - a top level means both cofactor results are already on top of results
+        stack: List[Tuple[int, int, int, Optional[int]]] = [(f, g, h, None)]
+        while stack:
+            f, g, h, top = stack.pop()
+            if top is not None:
+                high = results.pop()
+                low = results.pop()
+                result = self._make(top, low, high)
+                self._ite_cache[(f, g, h)] = result
+                results.append(result)
+                continue
+            result = self._ite_terminal_case(f, g, h)
+            if result is not None:
+                results.append(result)
+                continue
+            top = min(self.level(f), self.level(g), self.level(h))
+            f_low, f_high = self.cofactors(f, top)
+            g_low, g_high = self.cofactors(g, top)
+            h_low, h_high = self.cofactors(h, top)
+            stack.append((f, g, h, top))
+            stack.append((f_high, g_high, h_high, None))
+            stack.append((f_low, g_low, h_low, None))
+
+        return results[0]
+
+    def negate(self, f: int) -> int:
+        return self.ite(f, FALSE, TRUE)
+
+    def conjunction(self, f: int, g: int) -> int:
+        return self.ite(f, g, FALSE)
+
+    def disjunction(self, f: int, g: int) -> int:
+        return self.ite(f, TRUE, g)
+
+    def exclusive_or(self, f: int, g: int) -> int:
+        return self.ite(f, self.negate(g), g)
+
+    def restrict(self, f: int, assignment: Dict[int, int], cache: Optional[Dict[int, int]] = None) -> int:
+        """
+        Cofactors f by a partial assignment of variable levels to 0/1.
+        """
+        if cache is None:
+            cache = {}
+        cache.setdefault(FALSE, FALSE)
+        cache.setdefault(TRUE, TRUE)
+        stack = [(f, False)]
+        while stack:
+            node, children_ready = stack.pop()
+            if node in cache:
+                continue
+            level, low, high = self.nodes[node]
+            if level in assignment:
+                # the node reduces to one of its children, restricted in turn
+                child = high if assignment[level] else low
+                if child in cache:
+                    cache[node] = cache[child]
+                else:
+                    stack.append((node, False))
+                    stack.append((child, False))
+                continue
+            if not children_ready:
+                stack.append((node, True))
+                stack.extend(child for child in ((low, False), (high, False)) if child[0] not in cache)
+                continue
+            cache[node] = self._make(level, cache[low], cache[high])
+
+        return cache[f]
+
+    def from_expr(self, expr: Expr, cache: Optional[Dict[int, int]] = None) -> int:
+        """
+        The BDD of expr. cache maps id(expression node) -> BDD node and can be shared between calls, so the
+        sub-expressions shared by several next state functions are converted once.
+        """
+        if cache is None:
+            cache = {}
+        operators = {
+            boolean_expr.AND: self.conjunction,
+            boolean_expr.OR: self.disjunction,
+            boolean_expr.XOR: self.exclusive_or,
+        }
+        stack = [(expr, False)]
+        while stack:
+            node, operands_ready = stack.pop()
+            if id(node) in cache:
+                continue
+            kind = node[0]
+            if kind == boolean_expr.CONST:
+                cache[id(node)] = TRUE if node[1] else FALSE
+            elif kind == boolean_expr.VAR:
+                cache[id(node)] = self.var(node[1])
+            elif not operands_ready:
+                stack.append((node, True))
+                stack.extend((operand, False) for operand in ((node[1],) if kind == boolean_expr.NOT else node[1]))
+            elif kind == boolean_expr.NOT:
+                cache[id(node)] = self.negate(cache[id(node[1])])
+            else:
+                operands = [cache[id(operand)] for operand in node[1]]
+                result = operands[0]
+                for operand in operands[1:]:
+                    result = operators[kind](result, operand)
+                cache[id(node)] = result
+
+        return cache[id(expr)]
+
+
+class SymbolicFsm:
+    """
+    Next-state functions of an FSM held as BDDs.
+    Every flip-flop i contributes the state variables state_nets[i] = (Q, QN). Instead of evaluating every
+    (state, input) assignment, transitions are extracted only for states reachable from reset. The input space of
+    each state is partitioned by next state into characteristic BDDs, and each of those is written as the cubes of
+    its paths, so the cubes of a transition only split on the inputs that transition depends on.
+    """
+
+    def __init__(
+            self,
+            state_nets: List[Tuple[Optional[str], Optional[str]]],
+            input_nets: List[str],
+            next_state_exprs: List[Expr],
+    ) -> None:
+        if len(state_nets) != len(next_state_exprs):
+            raise FsmSymbolicException("Every flip-flop needs exactly one next state function")
+
+        state_variables = [net for pair in state_nets for net in pair if net is not None]
+        self.state_nets = state_nets
+        self.input_nets = input_nets
+        self.bdd = BDD(state_variables + list(input_nets))
+        self.input_offset: int = len(state_variables)
+        cache: Dict[int, int] = {}
+        self.next_state_funcs: List[int] = [self.bdd.from_expr(expr, cache) for expr in next_state_exprs]
+
+    def _state_assignment(self, state: str) -> Dict[int, int]:
+        assignment = {}
+        for (q_net, q_not_net), state_bit in zip(self.state_nets, state):
+            if q_net is not None:
+                assignment[self.bdd.levels[q_net]] = int(state_bit)
+            if q_not_net is not None:
+                assignment[self.bdd.levels[q_not_net]] = 1 - int(state_bit)
+
+        return assignment
+
+    def _partition_inputs(self, funcs: List[int]) -> Dict[str, int]:
+        """
+        Next state -> characteristic BDD of the inputs leading to it, refined one flip-flop at a time. Empty
+        classes are dropped, so there are never more classes than distinct next states.
+        """
+        partition = {"": TRUE}
+        for func in funcs:
+            not_func = self.bdd.negate(func)
+            refined = {}
+            for next_state, inputs in partition.items():
+                for bit, bit_func in (("0", not_func), ("1", func)):
+                    bit_inputs = self.bdd.conjunction(inputs, bit_func)
+                    if bit_inputs != FALSE:
+                        refined[next_state + bit] = bit_inputs
+            partition = refined
+
+        return partition
+
+    def _cubes(self, func: int) -> Iterator[str]:
+        """
+        The cubes of the paths of func to TRUE, pairwise disjoint, '-' for the inputs a path skips.
+        """
+        stack = [(func, ["-"] * len(self.input_nets))]
+        while stack:
+            node, cube = stack.pop()
+            if node == TRUE:
+                yield "".join(cube)
+                continue
+            if node == FALSE:
+                continue
+            level, low, high = self.bdd.nodes[node]
+            for value, child in (("1", high), ("0", low)):
+                child_cube = list(cube)
+                child_cube[level - self.input_offset] = value
+                stack.append((child, child_cube))
+
+    def transitions_from(self, state: str) -> List[Tuple[str, str]]:
+        """
+        (input cube, next state) pairs of state. Cubes use '-' for don't-care inputs and are pairwise disjoint.
+        """
+        assignment = self._state_assignment(state)
+        cache: Dict[int, int] = {}
+        funcs = [self.bdd.restrict(func, assignment, cache) for func in self.next_state_funcs]
+
+        return [
+            (cube, next_state)
+            for next_state, inputs in self._partition_inputs(funcs).items()
+            for cube in self._cubes(inputs)
+        ]
+
+    def get_states_diagram(self, reset_state: str) -> Dict[Tuple[str, str], str]:
+        """
+        Breadth first traversal from reset_state. Keys are (state, input cube) like HWCircuit.get_states_diagram.
+        """
+        if len(reset_state) != len(self.state_nets):
+            raise FsmSymbolicException(f"Reset state must have {len(self.state_nets)} bits")
+
+        states_diagram = {}
+        reached = {reset_state}
+        queue = deque([reset_state])
+        while queue:
+            state = queue.popleft()
+            for input_cube, next_state in self.transitions_from(state):
+                states_diagram[(state, input_cube)] = next_state
+                if next_state not in reached:
+                    reached.add(next_state)
+                    queue.append(next_state)
+
+        return states_diagram
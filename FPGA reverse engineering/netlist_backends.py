@@ -0,0 +1,180 @@
+from typing import Any, Dict, List, Optional, Tuple
+from abc import ABC, abstractmethod
+import importlib.util
+import logging
+import pathlib
+import sys, os
+
+import boolean_expr
+from boolean_expr import Expr
+from netlist_index import NetlistIndex
+from verilog_netlist import VerilogNetlist
+
+
+logger = logging.getLogger(__name__)
+
+HAL_BASE = "/usr/local/"
+
+
+class NetlistBackendException(Exception):
+    pass
+
+
+class NetlistBackend(ABC):
+    """
+    What HWCircuit needs from a netlist: a NetlistIndex, the SCCs of the gate graph (as gate ids), the Q / QN nets of
+    every flip-flop and its next state function over net-id-named variables.
+    A backend missing any of the abstract methods fails when it is created, not halfway through an analysis.
+    """
+    name = ""
+
+    def __init__(self, verilog_source_path: pathlib.Path, gates_lib_path: pathlib.Path) -> None:
+        self.verilog_source_path = verilog_source_path
+        self.gates_lib_path = gates_lib_path
+        self.index: NetlistIndex = NetlistIndex()
+
+    @abstractmethod
+    def get_gates(self) -> List[Any]:
+        pass
+
+    @abstractmethod
+    def get_strongly_connected_components(self) -> List[List[int]]:
+        pass
+
+    @abstractmethod
+    def get_flipflop_output_nets(self, gate_id: int) -> Tuple[Optional[int], Optional[int]]:
+        pass
+
+    @abstractmethod
+    def get_next_state_function(self, gate_id: int) -> Expr:
+        pass
+
+
+def _add_hal_to_path() -> None:
+    os.environ.setdefault("HAL_BASE_PATH", HAL_BASE)
+    if HAL_BASE + "lib/" not in sys.path:
+        sys.path.append(HAL_BASE + "lib/")
+
+
+def is_hal_available() -> bool:
+    _add_hal_to_path()
+    return importlib.util.find_spec("hal_py") is not None
+
+
+class HalNetlistBackend(NetlistBackend):
+    name = "hal"
+
+    def __init__(self, verilog_source_path: pathlib.Path, gates_lib_path: pathlib.Path) -> None:
+        super().__init__(verilog_source_path, gates_lib_path)
+        # importing HAL and loading its plugins is slow, so it only happens once this backend is actually used
+        _add_hal_to_path()
+        import hal_py
+        hal_py.plugin_manager.load_all_plugins()
+        from hal_plugins import graph_algorithm
+
+        self.hal_py = hal_py
+        self.graph_algorithms = hal_py.plugin_manager.get_plugin_instance("graph_algorithm")
+        self.netlist = hal_py.NetlistFactory.load_netlist(str(verilog_source_path), str(gates_lib_path))
+        self.gates: Dict[int, Any] = {gate.id: gate for gate in self.netlist.get_gates()}
+        self.nets: Dict[int, Any] = {net.id: net for net in self.netlist.get_nets()}
+        self.index = self._build_netlist_index()
+
+    def _build_netlist_index(self) -> NetlistIndex:
+        index = NetlistIndex()
+
+        for net in self.nets.values():
+            if net.is_global_input_net():
+                index.add_global_input_net(net.id)
+
+        for gate in self.gates.values():
+            properties = gate.type.get_properties()
+            is_sequential = self.hal_py.GateTypeProperty.sequential in properties
+            data_net = None
+            if is_sequential:
+                datapin = gate.get_type().get_pins_of_type(self.hal_py.PinType.data)
+                data_net = gate.get_fan_in_net(datapin.pop()).id
+            index.add_gate(
+                gate.id,
+                [net.id for net in gate.get_fan_in_nets()],
+                [net.id for net in gate.get_fan_out_nets()],
+                is_sequential,
+                data_net,
+                is_combinational=self.hal_py.GateTypeProperty.combinational in properties,
+            )
+
+        return index
+
+    def get_gates(self) -> List[Any]:
+        return self.netlist.get_gates()
+
+    def get_strongly_connected_components(self) -> List[List[int]]:
+        return [
+            [gate.id for gate in scc]
+            for scc in self.graph_algorithms.get_strongly_connected_components(self.netlist)
+        ]
+
+    def get_flipflop_output_nets(self, gate_id: int) -> Tuple[Optional[int], Optional[int]]:
+        # Each flip flop contains TWO output nets - Q, Qn!
+        fan_out_nets = self.index.gate_fan_out_nets[gate_id]
+        return fan_out_nets[0], fan_out_nets[1]
+
+    def get_next_state_function(self, gate_id: int) -> Expr:
+        fanin_net = self.nets[self.index.data_nets[gate_id]]
+        # the cone already stops at flip-flops, so no sequential gate has to be removed from it
+        subgraph_gates = [self.gates[cone_gate_id] for cone_gate_id in self.index.fan_in_cone(fanin_net.id)]
+        bool_func = self.hal_py.NetlistUtils.get_subgraph_function(fanin_net, subgraph_gates)
+        # one per flip-flop - only worth seeing when debugging, and formatted only then
+        logger.debug('Got a new boolean func: %s', bool_func)
+
+        return boolean_expr.parse(str(bool_func), bool_func.get_variables())
+
+    def create_module(self, name: str, parent: Optional[Any], gate_ids: List[int]) -> Any:
+        parent = parent if parent is not None else self.netlist.get_top_module()
+        return self.netlist.create_module(name, parent, [self.gates[gate_id] for gate_id in gate_ids])
+
+
+class PythonNetlistBackend(NetlistBackend):
+    """
+    HAL free backend: the built-in verilog parser, Tarjan SCC and the NanGate cell model of verilog_netlist.
+    """
+    name = "python"
+
+    def __init__(self, verilog_source_path: pathlib.Path, gates_lib_path: pathlib.Path) -> None:
+        super().__init__(verilog_source_path, gates_lib_path)
+        self.netlist: VerilogNetlist = VerilogNetlist.load(verilog_source_path, gates_lib_path)
+        self.index = self.netlist.build_index()
+        self._net_functions: Dict[int, Expr] = {}
+
+    def get_gates(self) -> List[Any]:
+        return self.netlist.get_gates()
+
+    def get_strongly_connected_components(self) -> List[List[int]]:
+        return self.netlist.get_strongly_connected_components(self.index)
+
+    def get_flipflop_output_nets(self, gate_id: int) -> Tuple[Optional[int], Optional[int]]:
+        gate = self.netlist.gates[gate_id]
+        return gate.pin_nets.get(gate.type.q_pin), gate.pin_nets.get(gate.type.q_not_pin)
+
+    def get_next_state_function(self, gate_id: int) -> Expr:
+        return self.netlist.get_next_state_function(gate_id, self.index, self._net_functions)
+
+
+NETLIST_BACKENDS = {
+    HalNetlistBackend.name: HalNetlistBackend,
+    PythonNetlistBackend.name: PythonNetlistBackend,
+}
+
+
+def resolve_backend_name(name: str = "auto") -> str:
+    """
+    'auto' picks HAL when it is installed and the built-in python backend otherwise.
+    """
+    if name == "auto":
+        return HalNetlistBackend.name if is_hal_available() else PythonNetlistBackend.name
+    if name not in NETLIST_BACKENDS:
+        raise NetlistBackendException(f"Unknown netlist backend {name}, expected one of {list(NETLIST_BACKENDS)}")
+    return name
+
+
+def create_backend(name: str, verilog_source_path: pathlib.Path, gates_lib_path: pathlib.Path) -> NetlistBackend:
+    return NETLIST_BACKENDS[resolve_backend_name(name)](verilog_source_path, gates_lib_path)
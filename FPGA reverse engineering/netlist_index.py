@@ -0,0 +1,106 @@
+from typing import Dict, Iterable, List, Optional, Set
+
+
+class NetlistIndex:
+    """
+    Set/dict based adjacency of a gate-level netlist, keyed by gate and net ids.
+    It is built once per netlist and all HWCircuit traversals run against it, so membership tests are O(1)
+    instead of scans over the netlist object lists.
+    """
+
+    def __init__(self) -> None:
+        self.gate_fan_in_nets: Dict[int, List[int]] = {}
+        self.gate_fan_out_nets: Dict[int, List[int]] = {}
+        self.net_sources: Dict[int, List[int]] = {}
+        self.net_destinations: Dict[int, List[int]] = {}
+        self.global_input_nets: Set[int] = set()
+        self.sequential_gates: Set[int] = set()
+        # explicitly combinational cells; anything else (tie cells, pads, cells of unknown type) is neither
+        self.combinational_gates: Set[int] = set()
+        self.data_nets: Dict[int, int] = {}             # flip-flop gate id -> next state (data pin) net id
+
+    def add_gate(
+            self,
+            gate_id: int,
+            fan_in_nets: List[int],
+            fan_out_nets: List[int],
+            is_sequential: bool = False,
+            data_net: Optional[int] = None,
+            is_combinational: bool = False,
+    ) -> None:
+        self.gate_fan_in_nets[gate_id] = fan_in_nets
+        self.gate_fan_out_nets[gate_id] = fan_out_nets
+        for net_id in fan_in_nets:
+            self.net_destinations.setdefault(net_id, []).append(gate_id)
+        for net_id in fan_out_nets:
+            self.net_sources.setdefault(net_id, []).append(gate_id)
+
+        if is_sequential:
+            self.sequential_gates.add(gate_id)
+        elif is_combinational:
+            self.combinational_gates.add(gate_id)
+        if data_net is not None:
+            self.data_nets[gate_id] = data_net
+
+    def add_global_input_net(self, net_id: int) -> None:
+        self.global_input_nets.add(net_id)
+
+    def is_sequential(self, gate_id: int) -> bool:
+        return gate_id in self.sequential_gates
+
+    def is_combinational(self, gate_id: int) -> bool:
+        return gate_id in self.combinational_gates
+
+    def is_unknown(self, gate_id: int) -> bool:
+        return gate_id not in self.sequential_gates and gate_id not in self.combinational_gates
+
+    def fan_in_cone(self, net_id: int) -> Set[int]:
+        """
+        The combinational gates driving net_id. The traversal stops at flip-flops, global inputs and cells that are
+        neither sequential nor combinational, whose outputs are the variables of the cone function.
+        """
+        cone_gates = set()
+        visited_nets = {net_id}
+        stack = [net_id]
+        while stack:
+            net = stack.pop()
+            for gate_id in self.net_sources.get(net, ()):
+                if gate_id in cone_gates or gate_id not in self.combinational_gates:
+                    continue
+                cone_gates.add(gate_id)
+                for fan_in_net in self.gate_fan_in_nets[gate_id]:
+                    if fan_in_net not in visited_nets and fan_in_net not in self.global_input_nets:
+                        visited_nets.add(fan_in_net)
+                        stack.append(fan_in_net)
+
+        return cone_gates
+
+    def fan_in_unknown_gates(self, net_id: int) -> Set[int]:
+        """
+        The gates of unknown type (see is_unknown) driving the fan-in cone of net_id. The cone stops at them, so
+        their outputs enter the cone function as free variables.
+        """
+        nets = {net_id}
+        for gate_id in self.fan_in_cone(net_id):
+            nets.update(self.gate_fan_in_nets[gate_id])
+
+        return {gate_id for net in nets for gate_id in self.net_sources.get(net, ()) if self.is_unknown(gate_id)}
+
+    def fan_out_flipflops(self, net_ids: Iterable[int]) -> Set[int]:
+        """
+        The flip-flops fed by net_ids through combinational logic, i.e. the registers whose next state (or clock,
+        enable, reset) depends on these nets.
+        """
+        flipflops = set()
+        visited_gates = set()
+        stack = list(net_ids)
+        while stack:
+            net = stack.pop()
+            for gate_id in self.net_destinations.get(net, ()):
+                if gate_id in self.sequential_gates:
+                    flipflops.add(gate_id)
+                elif gate_id in self.combinational_gates and gate_id not in visited_gates:
+                    visited_gates.add(gate_id)
+                    stack.extend(self.gate_fan_out_nets[gate_id])
+
+        return flipflops
@@ -1,25 +1,31 @@
-from typing import List, Dict, Tuple, Optional
-from pprint import pprint
+from typing import Any, List, Dict, Tuple, Optional, Set, Union
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property
+import logging
 import pathlib
-import itertools
-import sys, os
+import os
 
+import numpy as np
 
-HAL_BASE = "/usr/local/"
-os.environ["HAL_BASE_PATH"] = HAL_BASE
-sys.path.append(HAL_BASE+"lib/")
-import hal_py
-from hal_py import GateLibraryManager
-hal_py.plugin_manager.load_all_plugins()
-from hal_plugins import graph_algorithm
+import boolean_expr
+from analysis_cache import AnalysisCache
+from boolean_expr import Expr
+from fsm_bitparallel import BitParallelFsm
+from fsm_candidates import FsmCandidate, analyse_fsm_candidate, rank_fsm_candidates
+from fsm_symbolic import SymbolicFsm
+from netlist_backends import HAL_BASE, HalNetlistBackend, NetlistBackend, create_backend, resolve_backend_name
+from netlist_index import NetlistIndex
+from states_graph import StatesGraph
+from verilog_netlist import get_nangate_cells_digest
 
-graph_algorithms = hal_py.plugin_manager.get_plugin_instance("graph_algorithm")
+logger = logging.getLogger(__name__)
 
 # This macro should be updated to the verilog file local path
 VERILOG_SOURCE_PART_1_PATH = pathlib.Path("/home/hwsec/hal/project2_cipher_v1.v")
 VERILOG_SOURCE_PART_2_PATH = pathlib.Path("/home/hwsec/hal/project2_cipher_v2_obfuscated.v")
-GATES_LIB_PATH = pathlib.Path("/usr/local/share/hal/gate_libraries/NangateOpenCellLibrary.hgl")
+GATES_LIB_PATH = pathlib.Path(HAL_BASE) / "share/hal/gate_libraries/NangateOpenCellLibrary.hgl"
 STATES_DIAGRAM_DOT_PATH = pathlib.Path(os.getcwd()) / "states_diagram.dot"
+ANALYSIS_CACHE_DIR = pathlib.Path(os.getcwd()) / ".hwcircuit_cache"
 
 
 class HWCircuitException(Exception):
@@ -31,175 +37,436 @@ class HwCircuitNoFSMCandidatesException(HWCircuitException):
 
 
 class HWCircuit:
+    # symbolic: BDD based extraction of the states reachable from reset, inputs grouped into cubes
+    # enumerate: evaluation of every (state, input) assignment, bit-parallel over packed uint64 words
+    STATES_ENGINES = ("symbolic", "enumerate")
+
     def __init__(
             self,
             verilog_source_path: pathlib.Path,
             gates_lib_path: pathlib.Path,
+            states_engine: str = "symbolic",
+            reset_state: Optional[str] = None,
+            cache_dir: Optional[pathlib.Path] = ANALYSIS_CACHE_DIR,
+            backend: str = "auto",
+            verbose: bool = True,
+            candidates_to_analyse: int = 1,
+            candidate_workers: Optional[int] = None,
     ) -> None:
-        self.netlist: hal_py.Netlist = hal_py.NetlistFactory.load_netlist(str(verilog_source_path), str(gates_lib_path))
-        self.fsm: Optional[List[hal_py.Gate]] = self._get_fsm_candidate()
-        self.fsm_gates_module: hal_py.Module = self._get_fsm_gates_module()
-        self.combinational_gates_module: hal_py.Module = self._get_combinational_gates()
-        self.sequential_gates_module: hal_py.Module = self._get_sequential_gates()
-        self.boolean_funcs: List[hal_py.BooleanFunction] = self.get_boolean_funcs()
-        self.flipflops_output_nets: List[str] = self._get_flipflops_output_nets()
-        self.input_nets: List[str] = self._get_input_nets()
-        self.states_diagram: Dict[Tuple[str, str], str] = self.get_states_diagram()
-
-        print('The obtained states diagram:')
-        pprint(self.states_diagram)
-
-
-    def get_gates(self) -> List[hal_py.Gate]:
-        return self.netlist.get_gates()
-
-    def _get_fsm_candidate(self) -> Optional[List[hal_py.Gate]]:
-        scc_result = graph_algorithms.get_strongly_connected_components(self.netlist)
-        fsm_candidates = list(filter(lambda x: len(x) > 1, scc_result))
-        fsm_candidates = sorted(fsm_candidates, key=lambda x: len(x))
-        try:
-            # usually, FSMs are pretty small (however, not 1). Usually it is OK to return the smallest SCC
-            return fsm_candidates[0]
-        except Exception:
+        """
+        Analysis results are cached in cache_dir (None disables caching). On a cache hit the netlist is not even
+        loaded - the netlist backend, index and HAL modules below are lazy and only built when accessed.
+        backend is "hal", "python" (the built-in HAL free netlist parser) or "auto" (HAL when installed).
+        SCCs are ranked by structural features (see fsm_candidates). With candidates_to_analyse > 1 the states of
+        that many top-ranked SCCs are extracted in parallel, and the best ranked one that leaves its reset state
+        is kept. candidate_workers caps the worker processes for that (CPU count by default); with 1 the candidates
+        are analysed one after the other in this process.
+        """
+        if states_engine not in self.STATES_ENGINES:
+            raise HWCircuitException(f"Unknown states engine {states_engine}, expected one of {self.STATES_ENGINES}")
+        self.verilog_source_path: pathlib.Path = verilog_source_path
+        self.gates_lib_path: pathlib.Path = gates_lib_path
+        self.states_engine: str = states_engine
+        self.backend_name: str = resolve_backend_name(backend)
+        self.candidates_to_analyse: int = max(1, candidates_to_analyse)
+        self.candidate_workers: Optional[int] = candidate_workers
+        self.cache: Optional[AnalysisCache] = AnalysisCache(cache_dir) if cache_dir is not None else None
+        self.cache_key: Optional[str] = self._get_cache_key() if self.cache is not None else None
+        self.states_table: Optional[np.ndarray] = None
+
+        cache_entry = self.cache.load(self.cache_key) if self.cache is not None else None
+        self.cache_hit: bool = cache_entry is not None
+        states_diagram = None
+        if cache_entry is None:
+            states_diagram = self._select_fsm_candidate(reset_state)
+            self.reset_state: str = self._get_reset_state(reset_state, len(self.next_state_exprs))
+            # the entry is only built when it is going to be stored
+            if self.cache is not None:
+                cache_entry = self._new_cache_entry()
+                if states_diagram is not None:
+                    cache_entry["states_diagrams"][self.reset_state] = [
+                        [state, input, next_state] for (state, input), next_state in states_diagram.items()
+                    ]
+                    self.cache.store(self.cache_key, cache_entry)
+        else:
+            if verbose:
+                print(f'Loaded the FSM analysis of {verilog_source_path} from the cache')
+            self._load_cache_entry(cache_entry)
+            self.reset_state = self._get_reset_state(reset_state, len(self.next_state_exprs))
+        if self.states_engine == "enumerate":
+            self._load_states_table(cache_entry)
+        else:
+            self.states_diagram = (
+                states_diagram if states_diagram is not None else self._get_cached_states_diagram(cache_entry)
+            )
+
+        if verbose:
+            print(f'The obtained states diagram: {self.get_states_count()} states, '
+                  f'{self.get_transitions_count()} transitions')
+
+    @cached_property
+    def states_diagram(self) -> Dict[Tuple[str, str], str]:
+        """
+        (state, input) -> next state strings. The symbolic engine sets it directly; the enumerate engine keeps its
+        integer states_table and only builds this (2^(flip-flops + inputs) entries) when it is asked for.
+        """
+        return self.get_states_diagram(self.states_table)
+
+    @cached_property
+    def backend(self) -> NetlistBackend:
+        return create_backend(self.backend_name, self.verilog_source_path, self.gates_lib_path)
+
+    @cached_property
+    def netlist(self) -> Any:
+        return self.backend.netlist
+
+    @cached_property
+    def index(self) -> NetlistIndex:
+        return self.backend.index
+
+    @cached_property
+    def scc_result(self) -> List[List[int]]:
+        return self.backend.get_strongly_connected_components()
+
+    @cached_property
+    def fsm_candidates(self) -> List[FsmCandidate]:
+        return rank_fsm_candidates(self.scc_result, self.index)
+
+    @cached_property
+    def flipflop_ids(self) -> List[int]:
+        return self._get_flipflop_ids(self.fsm_gate_ids)
+
+    @cached_property
+    def fsm_gates_module(self) -> Any:
+        return self._get_fsm_gates_module()
+
+    @cached_property
+    def combinational_gates_module(self) -> Any:
+        return self._get_combinational_gates()
+
+    @cached_property
+    def sequential_gates_module(self) -> Any:
+        return self._get_sequential_gates()
+
+    def _get_cache_key(self) -> str:
+        """
+        Hashes the netlist and the gate library. Without a library file (the python backend then models the cells
+        itself), the built-in NanGate cell table is hashed instead.
+        """
+        salt = f"{self.backend_name}:{self.candidates_to_analyse}"
+        if not pathlib.Path(self.gates_lib_path).exists():
+            return AnalysisCache.get_key(self.verilog_source_path, salt=f"{salt}:nangate:{get_nangate_cells_digest()}")
+        return AnalysisCache.get_key(self.verilog_source_path, self.gates_lib_path, salt=salt)
+
+    def _new_cache_entry(self) -> Dict[str, Any]:
+        # the next state functions share most of their sub-expressions, so they are stored as one node table
+        next_state_table, next_state_roots = boolean_expr.to_table(self.next_state_exprs)
+        return {
+            "scc": self.scc_result,
+            "fsm_gate_ids": self.fsm_gate_ids,
+            "flipflops_output_nets": self.flipflops_output_nets,
+            "input_nets": self.input_nets,
+            "next_state_table": next_state_table,
+            "next_state_roots": next_state_roots,
+            "fsm_candidates": self.candidate_reports,
+            "states_diagrams": {},
+        }
+
+    def _load_cache_entry(self, cache_entry: Dict[str, Any]) -> None:
+        self.scc_result = cache_entry["scc"]
+        self.fsm_gate_ids = cache_entry["fsm_gate_ids"]
+        self.flipflops_output_nets = cache_entry["flipflops_output_nets"]
+        self.input_nets = cache_entry["input_nets"]
+        self.candidate_reports = cache_entry["fsm_candidates"]
+        self.next_state_exprs = boolean_expr.from_table(
+            cache_entry["next_state_table"], cache_entry["next_state_roots"]
+        )
+
+    def _load_states_table(self, cache_entry: Optional[Dict[str, Any]]) -> None:
+        """
+        The enumerated diagram covers every state, so only its (much more compact) integer table is stored.
+        cache_entry is None when caching is disabled.
+        """
+        # a table is already set when it was computed while selecting among several FSM candidates
+        new_table = self.states_table is not None
+        if self.states_table is None and self.cache is not None:
+            self.states_table = self.cache.load_table(self.cache_key, "states_table")
+        if self.states_table is None:
+            self.states_table = self.get_states_table()
+            new_table = True
+        if new_table and self.cache is not None:
+            self.cache.store(self.cache_key, cache_entry)
+            self.cache.store_table(self.cache_key, "states_table", self.states_table)
+
+    def _get_cached_states_diagram(self, cache_entry: Optional[Dict[str, Any]]) -> Dict[Tuple[str, str], str]:
+        """
+        The symbolic diagram depends on the reset state and is stored in the json entry.
+        cache_entry is None when caching is disabled.
+        """
+        cached_transitions = cache_entry["states_diagrams"].get(self.reset_state) if cache_entry is not None else None
+        if cached_transitions is not None:
+            return {(state, input): next_state for state, input, next_state in cached_transitions}
+
+        states_diagram = self.get_symbolic_states_diagram()
+        if self.cache is not None:
+            cache_entry["states_diagrams"][self.reset_state] = [
+                [state, input, next_state] for (state, input), next_state in states_diagram.items()
+            ]
+            self.cache.store(self.cache_key, cache_entry)
+
+        return states_diagram
+
+    def get_gates(self) -> List[Any]:
+        return self.backend.get_gates()
+
+    def _get_fsm_candidate(self) -> List[int]:
+        if not self.fsm_candidates:
             raise HwCircuitNoFSMCandidatesException()
+        return self.fsm_candidates[0].gate_ids
 
-    def _get_fsm_gates_module(self) -> hal_py.Module:
-        return self.netlist.create_module("fsm_gates", self.netlist.get_top_module(), list(self.fsm))
+    @staticmethod
+    def _get_reset_state(reset_state: Optional[str], states_length: int) -> str:
+        return reset_state if reset_state is not None else "0" * states_length
+
+    def _extract_fsm(self, gate_ids: List[int]) -> Tuple[List[Optional[str]], List[Expr], List[str]]:
+        """
+        Flip-flop output nets, next state functions and input nets of the SCC gate_ids.
+        """
+        flipflop_ids = self._get_flipflop_ids(gate_ids)
+        flipflops_output_nets = self._get_flipflops_output_nets(flipflop_ids)
+        next_state_exprs = self.get_boolean_funcs(flipflop_ids)
+
+        return flipflops_output_nets, next_state_exprs, self._get_input_nets(flipflops_output_nets, next_state_exprs)
+
+    def _select_fsm_candidate(self, reset_state: Optional[str]) -> Optional[Dict[Tuple[str, str], str]]:
+        """
+        Sets the FSM attributes to the chosen candidate. When several candidates were analysed, returns the states
+        diagram of the chosen one (symbolic engine) or stores its table in self.states_table (enumerate engine).
+        """
+        self.fsm_gate_ids: List[int] = self._get_fsm_candidate()
+        candidates = self.fsm_candidates[:self.candidates_to_analyse]
+        self.candidate_reports: List[Dict[str, Any]] = [candidate.get_features() for candidate in candidates]
+        unknown_gate_ids = set().union(*(candidate.unknown_gate_ids for candidate in candidates))
+        if unknown_gate_ids:
+            logger.warning(
+                "Gates %s of %s are neither sequential nor combinational, their outputs are treated as free inputs "
+                "of the FSM next state logic", sorted(unknown_gate_ids), self.verilog_source_path,
+            )
+        if len(candidates) == 1:
+            self.flipflops_output_nets, self.next_state_exprs, self.input_nets = self._extract_fsm(self.fsm_gate_ids)
+            return None
+
+        # the netlist is only indexed (and its net functions composed) once, in this process; workers get plain data
+        extracted_fsms = [self._extract_fsm(candidate.gate_ids) for candidate in candidates]
+        outcomes = self._analyse_fsm_candidates([
+            (
+                self._get_state_nets(flipflops_output_nets),
+                input_nets,
+                boolean_expr.to_table(next_state_exprs),
+                self.states_engine,
+                self._get_reset_state(reset_state, len(next_state_exprs)),
+            )
+            for flipflops_output_nets, next_state_exprs, input_nets in extracted_fsms
+        ])
+        analyses = []
+        for report, outcome, (_, next_state_exprs, _) in zip(self.candidate_reports, outcomes, extracted_fsms):
+            if isinstance(outcome, Exception):
+                report["error"] = f"{type(outcome).__name__}: {outcome}"
+                analyses.append(None)
+                continue
+            states_diagram, states_table = outcome
+            if states_table is not None:
+                reset = int(self._get_reset_state(reset_state, len(next_state_exprs)), 2)
+                report["reachable_states"] = int(self._get_reachable_states(states_table, reset).sum())
+            else:
+                report["reachable_states"] = len({state for state, _ in states_diagram})
+            analyses.append((states_diagram, states_table))
+
+        # a candidate stuck in its reset state is not a controller; keep the best ranked one that does move
+        best = next(
+            (i for i, report in enumerate(self.candidate_reports) if report.get("reachable_states", 0) > 1),
+            0,
+        )
+        self.fsm_gate_ids = candidates[best].gate_ids
+        self.flipflops_output_nets, self.next_state_exprs, self.input_nets = extracted_fsms[best]
+        if analyses[best] is None:
+            return None
+        states_diagram, self.states_table = analyses[best]
+
+        return states_diagram
+
+    def _analyse_fsm_candidates(self, jobs: List[Tuple]) -> List[Union[Tuple, Exception]]:
+        """
+        analyse_fsm_candidate over the jobs, in worker processes unless candidate_workers is 1. Every job yields
+        its result or the exception it raised.
+        """
+        workers = min(len(jobs), self.candidate_workers or os.cpu_count() or 1)
+        outcomes: List[Union[Tuple, Exception]] = []
+        if workers == 1:
+            for job in jobs:
+                try:
+                    outcomes.append(analyse_fsm_candidate(*job))
+                except Exception as e:
+                    outcomes.append(e)
+            return outcomes
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(analyse_fsm_candidate, *job) for job in jobs]
+            for future in futures:
+                try:
+                    outcomes.append(future.result())
+                except Exception as e:
+                    outcomes.append(e)
+
+        return outcomes
 
-    def _get_combinational_gates(self) -> hal_py.Module:
-        combi_gates = []
+    @staticmethod
+    def _get_reachable_states(states_table: np.ndarray, reset_state: int) -> np.ndarray:
+        reached = np.zeros(states_table.shape[0], dtype=bool)
+        reached[reset_state] = True
+        frontier = np.array([reset_state])
+        while frontier.size:
+            next_states = np.unique(states_table[frontier])
+            frontier = next_states[~reached[next_states]]
+            reached[frontier] = True
 
-        for gate in self.fsm:
-            if hal_py.GateTypeProperty.combinational in gate.type.get_properties():
-                combi_gates.append(gate)
+        return reached
 
-        return self.netlist.create_module("combinational_gates", self.fsm_gates_module, list(combi_gates))
+    def _get_hal_backend(self) -> HalNetlistBackend:
+        if not isinstance(self.backend, HalNetlistBackend):
+            raise HWCircuitException("HAL modules are only available with the HAL netlist backend")
+        return self.backend
 
-    def _get_sequential_gates(self) -> hal_py.Module:
-        seq_gates = []
+    def _get_fsm_gates_module(self) -> Any:
+        return self._get_hal_backend().create_module("fsm_gates", None, self.fsm_gate_ids)
 
-        for gate in self.fsm:
-            if hal_py.GateTypeProperty.sequential in gate.type.get_properties():
-                seq_gates.append(gate)
+    def _get_combinational_gates(self) -> Any:
+        combi_gates = [gate_id for gate_id in self.fsm_gate_ids if self.index.is_combinational(gate_id)]
 
-        return self.netlist.create_module("sequential_gates", self.fsm_gates_module, list(seq_gates))
+        return self._get_hal_backend().create_module("combinational_gates", self.fsm_gates_module, combi_gates)
 
-    def _get_flipflops_output_nets(self) -> List[str]:
+    def _get_sequential_gates(self) -> Any:
+        return self._get_hal_backend().create_module("sequential_gates", self.fsm_gates_module, self.flipflop_ids)
+
+    def _get_flipflop_ids(self, gate_ids: List[int]) -> List[int]:
+        return [gate_id for gate_id in gate_ids if self.index.is_sequential(gate_id)]
+
+    def _get_flipflops_output_nets(self, flipflop_ids: List[int]) -> List[Optional[str]]:
         output_nets = []
-        for gate in self.sequential_gates_module.get_gates():
-            Q_output = str(gate.get_fan_out_nets()[0].id)
-            Q_not_output = str(gate.get_fan_out_nets()[1].id)
-            output_nets.append(Q_output)
-            output_nets.append(Q_not_output)
+        for gate_id in flipflop_ids:
+            for output_net in self.backend.get_flipflop_output_nets(gate_id):
+                output_nets.append(str(output_net) if output_net is not None else None)
 
         return output_nets
 
-    def _get_input_nets(self) -> List[str]:
+    @staticmethod
+    def _get_input_nets(flipflops_output_nets: List[Optional[str]], next_state_exprs: List[Expr]) -> List[str]:
         input_nets = []
-        for bool_func in self.boolean_funcs:
-            for net_variable in bool_func.get_variables():
-                if net_variable in input_nets:
-                    continue
-                if net_variable not in self.flipflops_output_nets:
+        seen_nets: Set[Optional[str]] = set(flipflops_output_nets)
+        for bool_func in next_state_exprs:
+            for net_variable in boolean_expr.get_variables(bool_func):
+                if net_variable not in seen_nets:
+                    seen_nets.add(net_variable)
                     input_nets.append(net_variable)
 
         return input_nets
 
-    def get_boolean_funcs(self) -> List[hal_py.BooleanFunction]:
-        boolean_funcs = []
+    def get_boolean_funcs(self, flipflop_ids: Optional[List[int]] = None) -> List[Expr]:
+        """
+        The next state function of every flip-flop (self.flipflop_ids by default), over net-id-named variables.
+        """
+        if flipflop_ids is None:
+            flipflop_ids = self.flipflop_ids
+        return [self.backend.get_next_state_function(gate_id) for gate_id in flipflop_ids]
 
-        for ff in self.sequential_gates_module.get_gates():
-            datapin = ff.get_type().get_pins_of_type(hal_py.PinType.data)
-
-            fanin_net = ff.get_fan_in_net(datapin.pop())
-            subgraph_gates = self.dfs_from_net(fanin_net)
-            for ff1 in self.sequential_gates_module.get_gates():
-                subgraph_gates.remove(ff1)
-
-            tmp_func = hal_py.NetlistUtils.get_subgraph_function(fanin_net, subgraph_gates)
-            print(f'Whoo, Got a new boolean func: {str(tmp_func)}')
-            boolean_funcs.append(tmp_func)
-
-        return boolean_funcs
-
-    def get_states_diagram(self) -> Dict[Tuple[str, str], str]:
+    @staticmethod
+    def _get_state_nets(flipflops_output_nets: List[Optional[str]]) -> List[Tuple[Optional[str], Optional[str]]]:
+        # Each flip flop contains TWO output nets - Q, Qn!
+        return [
+            (flipflops_output_nets[2 * i], flipflops_output_nets[(2 * i) + 1])
+            for i in range(len(flipflops_output_nets) // 2)
+        ]
+
+    def get_symbolic_states_diagram(self) -> Dict[Tuple[str, str], str]:
+        """
+        Transitions of the states reachable from self.reset_state. The input part of every key is a cube over
+        self.input_nets, with '-' marking inputs the transition does not depend on.
+        """
+        state_nets = self._get_state_nets(self.flipflops_output_nets)
+        symbolic_fsm = SymbolicFsm(state_nets, self.input_nets, self.next_state_exprs)
+
+        return symbolic_fsm.get_states_diagram(self.reset_state)
+
+    def get_states_table(self) -> np.ndarray:
+        """
+        The full transition table, table[state, input] = next state, with states and inputs encoded MSB first
+        (flip-flop 0 / input net 0 is the most significant bit).
+        """
+        state_nets = self._get_state_nets(self.flipflops_output_nets)
+        bit_parallel_fsm = BitParallelFsm(state_nets, self.input_nets, self.next_state_exprs)
+
+        return bit_parallel_fsm.get_states_table()
+
+    def get_states_diagram(
+            self,
+            states_table: Optional[np.ndarray] = None,
+            states: Optional[np.ndarray] = None,
+    ) -> Dict[Tuple[str, str], str]:
+        """
+        The string form of states_table (computed if not given), restricted to the rows in states if given.
+        """
+        if states_table is None:
+            states_table = self.get_states_table()
+        if states is None:
+            states = np.arange(states_table.shape[0])
+        states_length = len(self.next_state_exprs)
+        inputs_length = len(self.input_nets)
         found_states = {}
-        states_length = len(self.sequential_gates_module.get_gates())
-        possible_states = list(itertools.product(["0", "1"], repeat=states_length))
-        possible_inputs = list(itertools.product(["0", "1"], repeat=len(self.input_nets)))
-
-        for state in possible_states:
-            instate = {}
-            for i, state_bit in enumerate(state):
-                if state_bit == "0":
-                    # Each flip flop contains TWO output nets - Q, Qn!
-                    instate[self.flipflops_output_nets[2 * i]] = hal_py.BooleanFunction.Value.ZERO
-                    instate[self.flipflops_output_nets[(2 * i) + 1]] = hal_py.BooleanFunction.Value.ONE
-                else:
-                    instate[self.flipflops_output_nets[2 * i]] = hal_py.BooleanFunction.Value.ONE
-                    instate[self.flipflops_output_nets[(2 * i) + 1]] = hal_py.BooleanFunction.Value.ZERO
-
-            for input in possible_inputs:
-                for i, input_bit in enumerate(input):
-                    if input_bit == "0":
-                        instate[self.input_nets[i]] = hal_py.BooleanFunction.Value.ZERO
-                    else:
-                        instate[self.input_nets[i]] = hal_py.BooleanFunction.Value.ONE
-
-                new_state_result = ''
-                for bool_func in self.boolean_funcs:
-                    new_state_result += self.get_state_str([bool_func.evaluate(instate)])
-
-                found_states[(''.join(state), ''.join(input))] = new_state_result
 
-        return found_states
-
-    def print_graph(self) -> None:
-        content = "digraph StatesFSM {\n"
-
-        printed_states = []
-
-        for inputs, result_state in self.states_diagram.items():
-            current_state = inputs[0]
-            current_input = inputs[1]
-            if (current_state, result_state) not in printed_states:
-                content += f"\t{current_state} -> {result_state} ;\n"
-                # uncomment this if printing with inputs is desired
-                #content += f"\t{current_state} -> {result_state} [label={current_input}];\n"
-                printed_states.append((current_state, result_state))
-
-        content += "}"
-
-        with open (STATES_DIAGRAM_DOT_PATH, 'w') as f:
-            f.write(content)
+        for state, next_states in zip(states.tolist(), states_table[states].tolist()):
+            state_str = format(state, f"0{states_length}b") if states_length else ""
+            for input, next_state in enumerate(next_states):
+                input_str = format(input, f"0{inputs_length}b") if inputs_length else ""
+                found_states[(state_str, input_str)] = format(next_state, f"0{states_length}b")
 
-    @staticmethod
-    def dfs_from_net(net: hal_py.Net) -> List[hal_py.Gate]:
-        gate_list = []
-        stack = [net]
-        while (stack):
-            n = stack.pop()
-            for endpoint in n.get_sources():
-                gate = endpoint.get_gate()
-                if gate not in gate_list:
-                    gate_list.append(gate)
-                    for net in gate.get_fan_in_nets():
-                        if not net.is_global_input_net():
-                            stack.append(net)
-
-        return gate_list
+        return found_states
 
-    @staticmethod
-    def get_state_str(state_dict) -> str:
-        return_str = ""
+    def get_states_count(self) -> int:
+        if self.states_table is not None:
+            # the enumerated table has a row for every state
+            return self.states_table.shape[0]
+        return len({state for state, _ in self.states_diagram} | set(self.states_diagram.values()))
 
-        for id in state_dict:
-            if id == hal_py.BooleanFunction.Value.ZERO:
-                return_str += '0'
-            else:
-                return_str += '1'
+    def get_transitions_count(self) -> int:
+        if self.states_table is not None:
+            return self.states_table.size
+        return len(self.states_diagram)
 
-        return return_str
+    def export_graph(
+            self,
+            path: pathlib.Path,
+            graph_format: Optional[str] = None,
+            reset_state: Optional[str] = None,
+            prune_unreachable: bool = True,
+            edge_labels: bool = True,
+    ) -> None:
+        """
+        Writes the states diagram as DOT, GraphML or JSON (see states_graph.GRAPH_FORMATS, by default by suffix).
+        Unless prune_unreachable is False, only states reachable from reset_state (self.reset_state by default)
+        are written. Edge labels are the input cubes of the transition, merged as far as possible.
+        """
+        reset_state = reset_state if reset_state is not None else self.reset_state
+        if self.states_table is not None and prune_unreachable:
+            # only the rows reachable from reset are turned into strings
+            reached = self._get_reachable_states(self.states_table, int(reset_state, 2) if reset_state else 0)
+            states_diagram = self.get_states_diagram(self.states_table, np.flatnonzero(reached))
+        else:
+            states_diagram = self.states_diagram
+        states_graph = StatesGraph(states_diagram, reset_state if prune_unreachable else None, self.input_nets)
+        states_graph.write(path, graph_format, edge_labels)
+
+    def print_graph(self, dot_path: pathlib.Path = STATES_DIAGRAM_DOT_PATH, edge_labels: bool = False) -> None:
+        self.export_graph(dot_path, "dot", edge_labels=edge_labels)
 
 
 def main():
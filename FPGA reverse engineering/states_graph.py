@@ -0,0 +1,143 @@
+from typing import Dict, Iterable, List, Optional, Set, TextIO, Tuple
+from collections import deque
+from xml.sax.saxutils import quoteattr
+import json
+import pathlib
+
+
+GRAPH_FORMATS = ("dot", "graphml", "json")
+GRAPH_FORMAT_SUFFIXES = {".dot": "dot", ".gv": "dot", ".graphml": "graphml", ".json": "json"}
+
+
+class StatesGraphException(Exception):
+    pass
+
+
+def merge_input_cubes(cubes: Iterable[str]) -> List[str]:
+    """
+    Merges cubes that differ in a single position (x0y, x1y -> x-y) until no position merges anymore.
+    Disjoint input cubes stay disjoint, so the result still covers every input exactly once.
+    """
+    cubes = set(cubes)
+    width = len(next(iter(cubes), ""))
+    merged = True
+    while merged and len(cubes) > 1:
+        merged = False
+        for position in range(width):
+            # cube with this position blanked -> values it takes there
+            values: Dict[Tuple[str, str], Set[str]] = {}
+            for cube in cubes:
+                values.setdefault((cube[:position], cube[position + 1:]), set()).add(cube[position])
+            next_cubes = set()
+            for (prefix, suffix), position_values in values.items():
+                if "0" in position_values and "1" in position_values:
+                    next_cubes.add(prefix + "-" + suffix)
+                    merged = True
+                    position_values -= {"0", "1"}
+                next_cubes.update(prefix + value + suffix for value in position_values)
+            cubes = next_cubes
+
+    return sorted(cubes)
+
+
+class StatesGraph:
+    """
+    Export view of a states diagram ((state, input cube) -> next state), as a graph with one edge per
+    (state, next state) pair. Given a reset state, only the subgraph reachable from it is kept.
+    Writers stream the graph to the file one node / edge at a time.
+    """
+
+    def __init__(
+            self,
+            states_diagram: Dict[Tuple[str, str], str],
+            reset_state: Optional[str] = None,
+            input_nets: Optional[List[str]] = None,
+    ) -> None:
+        self.reset_state: Optional[str] = reset_state
+        self.input_nets: List[str] = list(input_nets) if input_nets is not None else []
+        # (state, next state) -> input cubes taking state to next state
+        self.edges: Dict[Tuple[str, str], List[str]] = {}
+        for (state, input), next_state in states_diagram.items():
+            self.edges.setdefault((state, next_state), []).append(input)
+
+        if reset_state is not None:
+            reachable_states = self.get_reachable_states(reset_state)
+            self.edges = {edge: inputs for edge, inputs in self.edges.items() if edge[0] in reachable_states}
+
+        self.states: List[str] = sorted({state for edge in self.edges for state in edge})
+        if reset_state is not None and reset_state not in self.states:
+            self.states.insert(0, reset_state)
+
+    def get_reachable_states(self, reset_state: str) -> Set[str]:
+        successors: Dict[str, List[str]] = {}
+        for state, next_state in self.edges:
+            successors.setdefault(state, []).append(next_state)
+
+        reached = {reset_state}
+        queue = deque([reset_state])
+        while queue:
+            for next_state in successors.get(queue.popleft(), ()):
+                if next_state not in reached:
+                    reached.add(next_state)
+                    queue.append(next_state)
+
+        return reached
+
+    def get_edge_label(self, edge: Tuple[str, str]) -> str:
+        return " | ".join(merge_input_cubes(self.edges[edge]))
+
+    def write(self, path: pathlib.Path, graph_format: Optional[str] = None, edge_labels: bool = True) -> None:
+        """
+        graph_format is one of GRAPH_FORMATS, by default taken from the file suffix.
+        """
+        path = pathlib.Path(path)
+        if graph_format is None:
+            graph_format = GRAPH_FORMAT_SUFFIXES.get(path.suffix.lower())
+        if graph_format not in GRAPH_FORMATS:
+            raise StatesGraphException(f"Unknown graph format for {path}, expected one of {GRAPH_FORMATS}")
+
+        writer = {"dot": self.write_dot, "graphml": self.write_graphml, "json": self.write_json}[graph_format]
+        with open(path, "w") as f:
+            writer(f, edge_labels)
+
+    def write_dot(self, f: TextIO, edge_labels: bool = False) -> None:
+        f.write("digraph StatesFSM {\n")
+        if self.reset_state is not None:
+            f.write(f"\t{json.dumps(self.reset_state)} [shape=doublecircle];\n")
+        for edge in self.edges:
+            current_state, result_state = json.dumps(edge[0]), json.dumps(edge[1])
+            if edge_labels:
+                f.write(f"\t{current_state} -> {result_state} [label={json.dumps(self.get_edge_label(edge))}];\n")
+            else:
+                f.write(f"\t{current_state} -> {result_state} ;\n")
+        f.write("}\n")
+
+    def write_graphml(self, f: TextIO, edge_labels: bool = True) -> None:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+        f.write('  <key id="reset" for="node" attr.name="reset" attr.type="boolean"/>\n')
+        f.write('  <key id="inputs" for="edge" attr.name="inputs" attr.type="string"/>\n')
+        f.write('  <graph id="StatesFSM" edgedefault="directed">\n')
+        for state in self.states:
+            f.write(f'    <node id={quoteattr(state)}>')
+            f.write(f'<data key="reset">{str(state == self.reset_state).lower()}</data></node>\n')
+        for i, edge in enumerate(self.edges):
+            f.write(f'    <edge id="e{i}" source={quoteattr(edge[0])} target={quoteattr(edge[1])}>')
+            if edge_labels:
+                f.write(f'<data key="inputs">{self.get_edge_label(edge)}</data>')
+            f.write('</edge>\n')
+        f.write('  </graph>\n')
+        f.write('</graphml>\n')
+
+    def write_json(self, f: TextIO, edge_labels: bool = True) -> None:
+        f.write("{\n")
+        f.write(f'"reset_state": {json.dumps(self.reset_state)},\n')
+        f.write(f'"input_nets": {json.dumps(self.input_nets)},\n')
+        f.write(f'"states": {json.dumps(self.states)},\n')
+        f.write('"edges": [')
+        for i, edge in enumerate(self.edges):
+            entry = {"source": edge[0], "target": edge[1]}
+            if edge_labels:
+                entry["inputs"] = merge_input_cubes(self.edges[edge])
+            f.write(("," if i else "") + "\n" + json.dumps(entry))
+        f.write("\n]\n}\n")
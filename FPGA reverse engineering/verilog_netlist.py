@@ -0,0 +1,660 @@
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+import hashlib
+import json
+import pathlib
+import re
+
+import boolean_expr
+from boolean_expr import Expr
+from netlist_index import NetlistIndex
+
+
+class VerilogNetlistException(Exception):
+    pass
+
+
+class VerilogParseException(VerilogNetlistException):
+    pass
+
+
+# Built-in model of the NanGate open cell library, used when no HAL gate library (.hgl) can be read.
+# cell base name (without the _X<drive strength> suffix) -> (output pin -> function)
+NANGATE_COMBINATIONAL_CELLS: Dict[str, Dict[str, str]] = {
+    "INV": {"ZN": "!A"},
+    "BUF": {"Z": "A"},
+    "CLKBUF": {"Z": "A"},
+    "AND2": {"ZN": "A1 & A2"},
+    "AND3": {"ZN": "A1 & A2 & A3"},
+    "AND4": {"ZN": "A1 & A2 & A3 & A4"},
+    "NAND2": {"ZN": "!(A1 & A2)"},
+    "NAND3": {"ZN": "!(A1 & A2 & A3)"},
+    "NAND4": {"ZN": "!(A1 & A2 & A3 & A4)"},
+    "OR2": {"ZN": "A1 | A2"},
+    "OR3": {"ZN": "A1 | A2 | A3"},
+    "OR4": {"ZN": "A1 | A2 | A3 | A4"},
+    "NOR2": {"ZN": "!(A1 | A2)"},
+    "NOR3": {"ZN": "!(A1 | A2 | A3)"},
+    "NOR4": {"ZN": "!(A1 | A2 | A3 | A4)"},
+    "XOR2": {"Z": "A ^ B"},
+    "XNOR2": {"ZN": "!(A ^ B)"},
+    "AOI21": {"ZN": "!((B1 & B2) | A)"},
+    "AOI22": {"ZN": "!((A1 & A2) | (B1 & B2))"},
+    "AOI211": {"ZN": "!((C1 & C2) | B | A)"},
+    "AOI221": {"ZN": "!((C1 & C2) | A | (B1 & B2))"},
+    "AOI222": {"ZN": "!((A1 & A2) | (B1 & B2) | (C1 & C2))"},
+    "OAI21": {"ZN": "!((B1 | B2) & A)"},
+    "OAI22": {"ZN": "!((A1 | A2) & (B1 | B2))"},
+    "OAI211": {"ZN": "!((C1 | C2) & A & B)"},
+    "OAI221": {"ZN": "!((C1 | C2) & A & (B1 | B2))"},
+    "OAI222": {"ZN": "!((A1 | A2) & (B1 | B2) & (C1 | C2))"},
+    "OAI33": {"ZN": "!((A1 | A2 | A3) & (B1 | B2 | B3))"},
+    "MUX2": {"Z": "(A & !S) | (B & S)"},
+    "HA": {"CO": "A & B", "S": "A ^ B"},
+    "FA": {"CO": "(A & B) | (CI & (A | B))", "S": "A ^ B ^ CI"},
+    "LOGIC0": {"Z": "0"},
+    "LOGIC1": {"Z": "1"},
+}
+# Tri-state cells: their output also depends on the enable pin being driven, which the two-valued model cannot
+# express, so they are kept as cells of unknown type and reported instead of being folded into the logic.
+# cell base name -> (pins in declaration order, output pin -> function of the driven value)
+NANGATE_TRISTATE_CELLS: Dict[str, Tuple[List[str], Dict[str, str]]] = {
+    "TBUF": (["A", "EN", "Z"], {"Z": "A"}),
+    "TINV": (["EN", "I", "ZN"], {"ZN": "!I"}),
+}
+# cell base name -> (input pins, next state function, Q pin, QN pin)
+NANGATE_SEQUENTIAL_CELLS: Dict[str, Tuple[List[str], str, Optional[str], Optional[str]]] = {
+    "DFF": (["D", "CK"], "D", "Q", "QN"),
+    "DFFR": (["D", "RN", "CK"], "D", "Q", "QN"),
+    "DFFS": (["D", "SN", "CK"], "D", "Q", "QN"),
+    "DFFRS": (["D", "RN", "SN", "CK"], "D", "Q", "QN"),
+    "SDFF": (["D", "SE", "SI", "CK"], "(D & !SE) | (SI & SE)", "Q", "QN"),
+    "SDFFR": (["D", "RN", "SE", "SI", "CK"], "(D & !SE) | (SI & SE)", "Q", "QN"),
+    "SDFFS": (["D", "SE", "SI", "SN", "CK"], "(D & !SE) | (SI & SE)", "Q", "QN"),
+    "SDFFRS": (["D", "RN", "SE", "SI", "SN", "CK"], "(D & !SE) | (SI & SE)", "Q", "QN"),
+    "DLH": (["D", "G"], "D", "Q", None),
+    "DLL": (["D", "GN"], "D", "Q", None),
+}
+_DRIVE_STRENGTH_RE = re.compile(r"_X\d+$")
+
+
+def get_nangate_cells_digest() -> str:
+    """
+    Content hash of the built-in NanGate cell model, standing in for the gate library file when there is none.
+    """
+    cells = json.dumps([NANGATE_COMBINATIONAL_CELLS, NANGATE_TRISTATE_CELLS, NANGATE_SEQUENTIAL_CELLS],
+                       sort_keys=True)
+    return hashlib.sha256(cells.encode()).hexdigest()
+
+
+class CellType:
+    """
+    A library cell. Combinational outputs are modelled by their functions and truth tables over input_pins:
+    bit i of truth_tables[pin] is the output for the input assignment whose bit j is input_pins[j].
+    Flip-flops expose their next state function over the input pins and their Q / QN output pins.
+    Cells that are neither sequential nor combinational (e.g. typed only as power / ground / pad in a gate library)
+    are kept for parsing, but the next state logic never looks through them.
+    pin_order is the order positional instance connections bind to, inputs then outputs unless given.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            input_pins: List[str],
+            output_functions: Dict[str, Expr],
+            is_sequential: bool = False,
+            next_state_function: Optional[Expr] = None,
+            q_pin: Optional[str] = None,
+            q_not_pin: Optional[str] = None,
+            is_combinational: Optional[bool] = None,
+            pin_order: Optional[List[str]] = None,
+    ) -> None:
+        self.name = name
+        self.input_pins = input_pins
+        self.output_functions = output_functions
+        self.is_sequential = is_sequential
+        self.is_combinational = not is_sequential if is_combinational is None else is_combinational
+        self.next_state_function = next_state_function
+        self.q_pin = q_pin
+        self.q_not_pin = q_not_pin
+        self.output_pins: List[str] = list(output_functions) if not is_sequential else \
+            [pin for pin in (q_pin, q_not_pin) if pin is not None]
+        self.pin_order: List[str] = self.input_pins + self.output_pins if pin_order is None else pin_order
+        self.truth_tables: Dict[str, int] = {} if is_sequential else {
+            pin: self._get_truth_table(function) for pin, function in output_functions.items()
+        }
+
+    def _get_truth_table(self, function: Expr) -> int:
+        truth_table = 0
+        for assignment in range(1 << len(self.input_pins)):
+            values = {pin: (assignment >> j) & 1 for j, pin in enumerate(self.input_pins)}
+            truth_table |= boolean_expr.evaluate(function, values) << assignment
+
+        return truth_table
+
+    def evaluate(self, pin: str, input_values: Dict[str, int]) -> int:
+        assignment = sum(input_values[input_pin] << j for j, input_pin in enumerate(self.input_pins))
+        return (self.truth_tables[pin] >> assignment) & 1
+
+    def get_constant_output(self, pin: str) -> Optional[int]:
+        """
+        0 / 1 if the output does not depend on the inputs at all (tie cells), None otherwise.
+        """
+        all_ones = (1 << (1 << len(self.input_pins))) - 1
+        truth_table = self.truth_tables.get(pin)
+        if truth_table == 0:
+            return 0
+        if truth_table == all_ones:
+            return 1
+        return None
+
+
+class CellLibrary:
+    def __init__(self, cells: Dict[str, CellType]) -> None:
+        self.cells = cells
+
+    def get(self, cell_name: str) -> CellType:
+        cell = self.cells.get(cell_name) or self.cells.get(_DRIVE_STRENGTH_RE.sub("", cell_name))
+        if cell is None:
+            raise VerilogNetlistException(f"Unknown cell {cell_name}")
+        return cell
+
+    def __contains__(self, cell_name: str) -> bool:
+        return cell_name in self.cells or _DRIVE_STRENGTH_RE.sub("", cell_name) in self.cells
+
+    @classmethod
+    def nangate(cls) -> "CellLibrary":
+        cells = {}
+        for name, functions in NANGATE_COMBINATIONAL_CELLS.items():
+            output_functions = {pin: boolean_expr.parse(function) for pin, function in functions.items()}
+            input_pins = sorted({variable for function in output_functions.values()
+                                 for variable in boolean_expr.get_variables(function)})
+            cells[name] = CellType(name, input_pins, output_functions)
+        for name, (pin_order, functions) in NANGATE_TRISTATE_CELLS.items():
+            output_functions = {pin: boolean_expr.parse(function) for pin, function in functions.items()}
+            input_pins = [pin for pin in pin_order if pin not in output_functions]
+            cells[name] = CellType(name, input_pins, output_functions, is_combinational=False, pin_order=pin_order)
+        for name, (input_pins, next_state, q_pin, q_not_pin) in NANGATE_SEQUENTIAL_CELLS.items():
+            cells[name] = CellType(name, input_pins, {}, True, boolean_expr.parse(next_state, input_pins),
+                                   q_pin, q_not_pin)
+
+        return cls(cells)
+
+    @classmethod
+    def from_hgl(cls, gates_lib_path: pathlib.Path) -> "CellLibrary":
+        """
+        Reads the cells of a HAL json gate library. Cells the library cannot describe (e.g. missing functions)
+        are skipped; the built-in NanGate model fills in for them. Positional connections bind to the pins in the
+        order the library declares them.
+        """
+        with open(gates_lib_path, "r") as f:
+            library = json.load(f)
+
+        cells = {}
+        for cell in library.get("cells", []):
+            pins = list(cell.get("pins", []))
+            for pin_group in cell.get("pin_groups", []):
+                pins.extend(pin_group.get("pins", []))
+            input_pins = [pin["name"] for pin in pins if pin.get("direction") == "input"]
+            output_pins = [pin for pin in pins if pin.get("direction") == "output"]
+            pin_order = [pin["name"] for pin in pins]
+            types = set(cell.get("types", []))
+            try:
+                if "sequential" in types or "ff" in types:
+                    ff_config = cell.get("ff_config", {})
+                    q_pin = next((pin["name"] for pin in output_pins if pin.get("type") == "state"), None)
+                    q_not_pin = next((pin["name"] for pin in output_pins if pin.get("type") == "neg_state"), None)
+                    if "next_state" not in ff_config or q_pin is None:
+                        continue
+                    cells[cell["name"]] = CellType(
+                        cell["name"], input_pins, {}, True,
+                        boolean_expr.parse(ff_config["next_state"], input_pins), q_pin, q_not_pin,
+                        pin_order=pin_order,
+                    )
+                else:
+                    output_functions = {pin["name"]: boolean_expr.parse(pin["function"], input_pins)
+                                        for pin in output_pins if "function" in pin}
+                    if len(output_functions) != len(output_pins):
+                        continue
+                    cells[cell["name"]] = CellType(cell["name"], input_pins, output_functions,
+                                                   is_combinational="combinational" in types, pin_order=pin_order)
+            except boolean_expr.BooleanExprException:
+                continue
+
+        return cls(cells)
+
+    @classmethod
+    def load(cls, gates_lib_path: Optional[pathlib.Path] = None) -> "CellLibrary":
+        library = cls.nangate()
+        if gates_lib_path is not None:
+            try:
+                library.cells.update(cls.from_hgl(gates_lib_path).cells)
+            except (OSError, ValueError):
+                pass
+
+        return library
+
+
+class Gate:
+    def __init__(self, id: int, name: str, cell: CellType, pin_nets: Dict[str, int]) -> None:
+        self.id = id
+        self.name = name
+        self.type = cell
+        self.pin_nets = pin_nets                        # pin -> net id
+
+    def get_fan_in_nets(self) -> List[int]:
+        return [self.pin_nets[pin] for pin in self.type.input_pins if pin in self.pin_nets]
+
+    def get_fan_out_nets(self) -> List[int]:
+        return [self.pin_nets[pin] for pin in self.type.output_pins if pin in self.pin_nets]
+
+
+class Net:
+    def __init__(self, id: int, name: str) -> None:
+        self.id = id
+        self.name = name
+        self.is_global_input = False
+        self.is_global_output = False
+        self.constant: Optional[int] = None
+
+
+_TOKEN_RE = re.compile(r"""
+    (?P<space>\s+|//[^\n]*|/\*.*?\*/)
+  | (?P<escaped>\\\S+)
+  | (?P<number>\d*'[bBhHdDoO][0-9a-fA-FxXzZ_]+|\d+)
+  | (?P<identifier>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<symbol>[()\[\]{},;.:=#])
+""", re.VERBOSE | re.DOTALL)
+
+
+def _tokenize(text: str) -> Iterator[str]:
+    position = 0
+    while position < len(text):
+        match = _TOKEN_RE.match(text, position)
+        if match is None:
+            raise VerilogParseException(f"Unexpected character at offset {position}: {text[position:position + 20]!r}")
+        position = match.end()
+        if match.lastgroup == "space":
+            continue
+        token = match.group()
+        # escaped identifiers keep their name without the leading backslash
+        yield token[1:] if match.lastgroup == "escaped" else token
+
+
+def _constant_bits(literal: str) -> List[int]:
+    """
+    Bits of a sized verilog literal, MSB first (1'b0, 4'hA, ...).
+    """
+    if "'" not in literal:
+        return [int(bit) for bit in bin(int(literal))[len('0b'):]]
+    size, value = literal.split("'")
+    base = {"b": 2, "h": 16, "d": 10, "o": 8}[value[0].lower()]
+    digits = value[1:].replace("_", "").lower().replace("x", "0").replace("z", "0")
+    width = int(size) if size else 32
+
+    return [(int(digits, base) >> i) & 1 for i in reversed(range(width))]
+
+
+class VerilogNetlist:
+    """
+    A flat gate-level verilog netlist (one module instantiating library cells only) parsed into an in-memory
+    graph. Gate and net ids are assigned in order of appearance, starting at 1 like HAL.
+    """
+
+    def __init__(self, cell_library: CellLibrary) -> None:
+        self.cell_library = cell_library
+        self.module_name: str = ""
+        self.gates: Dict[int, Gate] = {}
+        self.nets: Dict[int, Net] = {}
+        self._net_ids: Dict[str, int] = {}
+        self._bus_ranges: Dict[str, Tuple[int, int]] = {}
+        self._aliases: Dict[int, int] = {}
+
+    @classmethod
+    def load(cls, verilog_source_path: pathlib.Path, gates_lib_path: Optional[pathlib.Path] = None) -> "VerilogNetlist":
+        netlist = cls(CellLibrary.load(gates_lib_path))
+        with open(verilog_source_path, "r") as f:
+            netlist.parse(f.read())
+
+        return netlist
+
+    def _get_net(self, name: str) -> int:
+        net_id = self._net_ids.get(name)
+        if net_id is None:
+            net_id = len(self.nets) + 1
+            self.nets[net_id] = Net(net_id, name)
+            self._net_ids[name] = net_id
+
+        return net_id
+
+    def _constant_net(self, value: int) -> int:
+        net_id = self._get_net(f"'{value}'")
+        self.nets[net_id].constant = value
+        return net_id
+
+    def _resolve(self, net_id: int) -> int:
+        visited = {net_id}
+        while net_id in self._aliases:
+            net_id = self._aliases[net_id]
+            if net_id in visited:
+                raise VerilogParseException(f"Cyclic assign through net {self.nets[net_id].name}")
+            visited.add(net_id)
+        return net_id
+
+    def _bus_bits(self, name: str) -> List[str]:
+        if name not in self._bus_ranges:
+            return [name]
+        msb, lsb = self._bus_ranges[name]
+        step = -1 if msb >= lsb else 1
+        return [f"{name}[{i}]" for i in range(msb, lsb + step, step)]
+
+    def parse(self, text: str) -> None:
+        tokens = list(_tokenize(text))
+        position = 0
+
+        def peek() -> Optional[str]:
+            return tokens[position] if position < len(tokens) else None
+
+        def take(expected: Optional[str] = None) -> str:
+            nonlocal position
+            if position >= len(tokens):
+                raise VerilogParseException("Unexpected end of file")
+            token = tokens[position]
+            if expected is not None and token != expected:
+                raise VerilogParseException(f"Expected {expected!r}, got {token!r}")
+            position += 1
+            return token
+
+        def parse_range() -> Optional[Tuple[int, int]]:
+            if peek() != "[":
+                return None
+            take("[")
+            msb = int(take())
+            take(":")
+            lsb = int(take())
+            take("]")
+            return msb, lsb
+
+        def parse_signal() -> List[int]:
+            """
+            A connected expression: identifier, bit select, part select, constant or concatenation; MSB first.
+            """
+            token = take()
+            if token == "{":
+                bits = parse_signal()
+                while peek() == ",":
+                    take(",")
+                    bits.extend(parse_signal())
+                take("}")
+                return bits
+            if token[0].isdigit() or token[0] == "'":
+                return [self._constant_net(bit) for bit in _constant_bits(token)]
+            if peek() == "[":
+                take("[")
+                msb = int(take())
+                if peek() == ":":
+                    take(":")
+                    lsb = int(take())
+                    take("]")
+                    step = -1 if msb >= lsb else 1
+                    return [self._get_net(f"{token}[{i}]") for i in range(msb, lsb + step, step)]
+                take("]")
+                return [self._get_net(f"{token}[{msb}]")]
+            return [self._get_net(bit) for bit in self._bus_bits(token)]
+
+        def declare(keyword: str, name: str, bus_range: Optional[Tuple[int, int]]) -> List[int]:
+            if bus_range is not None:
+                self._bus_ranges[name] = bus_range
+            net_ids = [self._get_net(bit) for bit in self._bus_bits(name)]
+            for net_id in net_ids:
+                net = self.nets[net_id]
+                net.is_global_input |= keyword in ("input", "inout")
+                net.is_global_output |= keyword in ("output", "inout")
+                if keyword in ("supply0", "supply1"):
+                    net.constant = int(keyword == "supply1")
+            return net_ids
+
+        def parse_ports() -> None:
+            """
+            The module port list. ANSI style ports (input [3:0] a, b, output y) are declared here, with the
+            direction and range carrying over to the following names; plain names are declared in the body.
+            """
+            take("(")
+            direction, bus_range = None, None
+            while peek() != ")":
+                if peek() in ("input", "output", "inout"):
+                    direction = take()
+                    if peek() in ("wire", "reg", "tri"):
+                        take()
+                    bus_range = parse_range()
+                name = take()
+                if direction is not None:
+                    declare(direction, name, bus_range)
+                if peek() != ")":
+                    take(",")
+            take(")")
+
+        while peek() is not None:
+            keyword = take()
+            if keyword == "module":
+                self.module_name = take()
+                if peek() == "(":
+                    parse_ports()
+                take(";")
+            elif keyword in ("input", "output", "inout", "wire", "tri", "supply0", "supply1"):
+                bus_range = parse_range()
+                while True:
+                    name = take()
+                    targets = declare(keyword, name, bus_range)
+                    if peek() == "=":
+                        # net declaration assignment (wire n1 = a;), same as a continuous assign
+                        take("=")
+                        sources = parse_signal()
+                        if len(targets) != len(sources):
+                            raise VerilogParseException(f"Width mismatch in declaration of {name}")
+                        for target, source in zip(targets, sources):
+                            self._aliases[target] = source
+                    separator = take()
+                    if separator == ";":
+                        break
+                    if separator != ",":
+                        raise VerilogParseException(f"Expected ',' or ';' in declaration of {name}, got {separator!r}")
+            elif keyword == "assign":
+                while True:
+                    targets = parse_signal()
+                    take("=")
+                    sources = parse_signal()
+                    if len(targets) != len(sources):
+                        raise VerilogParseException(f"Width mismatch in assign to {self.nets[targets[0]].name}")
+                    for target, source in zip(targets, sources):
+                        self._aliases[target] = source
+                    if take() == ";":
+                        break
+            elif keyword == "endmodule":
+                continue
+            elif keyword in self.cell_library:
+                self._parse_instance(keyword, take, peek, parse_signal)
+            else:
+                raise VerilogParseException(f"Unsupported construct or unknown cell {keyword!r} "
+                                            f"(only flat netlists of library cells are supported)")
+
+        self._apply_aliases()
+
+    def _parse_instance(self, cell_name: str, take, peek, parse_signal) -> None:
+        cell = self.cell_library.get(cell_name)
+        instance_name = take()
+        take("(")
+        pin_nets = {}
+        position = 0
+        while peek() != ")":
+            if peek() == ".":
+                take(".")
+                pin = take()
+                take("(")
+                bits = parse_signal() if peek() != ")" else []
+                take(")")
+            else:
+                if position >= len(cell.pin_order):
+                    raise VerilogParseException(f"Too many connections to {instance_name}")
+                pin = cell.pin_order[position]
+                bits = parse_signal()
+            position += 1
+            if len(bits) > 1:
+                raise VerilogParseException(f"Multi-bit connection to {instance_name}.{pin}")
+            if bits:
+                pin_nets[pin] = bits[0]
+            if peek() == ",":
+                take(",")
+        take(")")
+        take(";")
+
+        gate_id = len(self.gates) + 1
+        self.gates[gate_id] = Gate(gate_id, instance_name, cell, pin_nets)
+
+    def _apply_aliases(self) -> None:
+        if not self._aliases:
+            return
+        for gate in self.gates.values():
+            gate.pin_nets = {pin: self._resolve(net_id) for pin, net_id in gate.pin_nets.items()}
+        for alias, net_id in self._aliases.items():
+            target = self.nets[self._resolve(net_id)]
+            target.is_global_output |= self.nets[alias].is_global_output
+            target.is_global_input |= self.nets[alias].is_global_input
+            del self.nets[alias]
+        self._aliases.clear()
+
+    def get_gates(self) -> List[Gate]:
+        return list(self.gates.values())
+
+    def get_nets(self) -> List[Net]:
+        return list(self.nets.values())
+
+    def build_index(self) -> NetlistIndex:
+        index = NetlistIndex()
+        for net in self.nets.values():
+            if net.is_global_input or net.constant is not None:
+                index.add_global_input_net(net.id)
+        for gate in self.gates.values():
+            data_net = None
+            if gate.type.is_sequential:
+                # the first variable of the next state function is the data pin (D of every NanGate flip-flop)
+                data_net = gate.pin_nets.get(boolean_expr.get_variables(gate.type.next_state_function)[0])
+            index.add_gate(gate.id, gate.get_fan_in_nets(), gate.get_fan_out_nets(), gate.type.is_sequential, data_net,
+                           is_combinational=gate.type.is_combinational)
+
+        return index
+
+    def get_strongly_connected_components(self, index: NetlistIndex) -> List[List[int]]:
+        """
+        Tarjan's algorithm over the gate graph (gate -> gates reading its outputs), iterative so deep netlists do
+        not hit the recursion limit.
+        """
+        successors = {
+            gate_id: [destination for net_id in fan_out_nets for destination in index.net_destinations.get(net_id, ())]
+            for gate_id, fan_out_nets in index.gate_fan_out_nets.items()
+        }
+        indices: Dict[int, int] = {}
+        low_links: Dict[int, int] = {}
+        on_stack: Set[int] = set()
+        stack: List[int] = []
+        components: List[List[int]] = []
+
+        for root in successors:
+            if root in indices:
+                continue
+            work = [(root, 0)]
+            while work:
+                gate_id, child_position = work.pop()
+                if child_position == 0:
+                    indices[gate_id] = low_links[gate_id] = len(indices)
+                    stack.append(gate_id)
+                    on_stack.add(gate_id)
+                children = successors[gate_id]
+                while child_position < len(children):
+                    child = children[child_position]
+                    child_position += 1
+                    if child not in indices:
+                        work.append((gate_id, child_position))
+                        work.append((child, 0))
+                        break
+                    if child in on_stack:
+                        low_links[gate_id] = min(low_links[gate_id], indices[child])
+                else:
+                    if low_links[gate_id] == indices[gate_id]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == gate_id:
+                                break
+                        components.append(component)
+                    if work:
+                        parent = work[-1][0]
+                        low_links[parent] = min(low_links[parent], low_links[gate_id])
+
+        return components
+
+    @staticmethod
+    def _check_connected(gate: Gate, function: Expr) -> None:
+        """
+        Every input pin function reads must be connected, or the pin name would be left as a free variable among
+        the net ids.
+        """
+        unconnected_pins = [pin for pin in boolean_expr.get_variables(function) if pin not in gate.pin_nets]
+        if unconnected_pins:
+            raise VerilogNetlistException(f"Unconnected input pins {unconnected_pins} of {gate.name}")
+
+    def get_net_function(self, net_id: int, index: NetlistIndex, cache: Optional[Dict[int, Expr]] = None) -> Expr:
+        """
+        The function of net_id over flip-flop outputs and global inputs, composed from the cell functions of its
+        combinational fan-in cone. Variables are named by net id, like hal_py.NetlistUtils.get_subgraph_function.
+        """
+        if cache is None:
+            cache = {}
+        expanding: Set[int] = set()
+        stack = [net_id]
+        while stack:
+            net = stack[-1]
+            if net in cache:
+                stack.pop()
+                continue
+            constant = self.nets[net].constant
+            sources = index.net_sources.get(net, ())
+            if constant is not None:
+                cache[net] = (boolean_expr.CONST, constant)
+            elif net in index.global_input_nets or not sources or not index.is_combinational(sources[0]):
+                # flip-flop outputs and the outputs of cells of unknown type are free variables
+                cache[net] = (boolean_expr.VAR, str(net))
+            else:
+                gate = self.gates[sources[0]]
+                pending = [gate.pin_nets[pin] for pin in gate.type.input_pins
+                           if pin in gate.pin_nets and gate.pin_nets[pin] not in cache]
+                if pending:
+                    if net in expanding:
+                        raise VerilogNetlistException(f"Combinational loop through net {self.nets[net].name}")
+                    expanding.add(net)
+                    stack.extend(pending)
+                    continue
+                pin = next(pin for pin, pin_net in gate.pin_nets.items() if pin_net == net)
+                constant = gate.type.get_constant_output(pin)
+                if constant is not None:
+                    cache[net] = (boolean_expr.CONST, constant)
+                else:
+                    function = gate.type.output_functions[pin]
+                    self._check_connected(gate, function)
+                    replacements = {pin_name: cache[gate.pin_nets[pin_name]] for pin_name in gate.type.input_pins
+                                    if pin_name in gate.pin_nets}
+                    cache[net] = boolean_expr.substitute(function, replacements)
+            stack.pop()
+
+        return cache[net_id]
+
+    def get_next_state_function(self, gate_id: int, index: NetlistIndex, cache: Optional[Dict[int, Expr]] = None) -> Expr:
+        gate = self.gates[gate_id]
+        if not gate.type.is_sequential:
+            raise VerilogNetlistException(f"{gate.name} is not a flip-flop")
+        self._check_connected(gate, gate.type.next_state_function)
+        replacements = {pin: self.get_net_function(net_id, index, cache) for pin, net_id in gate.pin_nets.items()
+                        if pin in gate.type.input_pins}
+
+        return boolean_expr.substitute(gate.type.next_state_function, replacements)
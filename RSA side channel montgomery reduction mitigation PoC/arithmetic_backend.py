@@ -0,0 +1,187 @@
+import math
+import random
+
+try:
+    import gmpy2
+except ImportError:
+    gmpy2 = None
+
+
+class ArithmeticBackendException(Exception):
+    pass
+
+
+class PythonBackend(object):
+    """
+    Plain CPython integers - the reference behavior of ModularExp.
+    """
+    name = 'python'
+
+    @staticmethod
+    def number(value):
+        return int(value)
+
+    @staticmethod
+    def square_mod(a, modulus):
+        return ((a * a) % modulus)
+
+    @staticmethod
+    def multiply_mod(a, b, modulus):
+        return ((a * b) % modulus)
+
+    @staticmethod
+    def invert(a, modulus):
+        return pow(a, -1, modulus)
+
+    @staticmethod
+    def pow_mod(base, exponent, modulus):
+        return pow(base, exponent, modulus)
+
+    @staticmethod
+    def gcd(a, b):
+        return math.gcd(a, b)
+
+    @staticmethod
+    def is_probable_prime(candidate, rounds=40):
+        if candidate < 2:
+            return False
+        for small_prime in (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37):
+            if candidate % small_prime == 0:
+                return candidate == small_prime
+
+        # Miller-Rabin
+        d = candidate - 1
+        s = 0
+        while d % 2 == 0:
+            d //= 2
+            s += 1
+        for _ in range(rounds):
+            x = pow(random.randrange(2, candidate - 1), d, candidate)
+            if x == 1 or x == candidate - 1:
+                continue
+            for _ in range(s - 1):
+                x = pow(x, 2, candidate)
+                if x == candidate - 1:
+                    break
+            else:
+                return False
+
+        return True
+
+    def getrandbits(self, bit_count):
+        return self.number(random.getrandbits(bit_count))
+
+    def random_prime(self, bit_count):
+        while True:
+            # top two bits set so that p * q has exactly 2 * bit_count bits, lowest bit set for oddness
+            candidate = random.getrandbits(bit_count) | (3 << (bit_count - 2)) | 1
+            if self.is_probable_prime(candidate):
+                return self.number(candidate)
+
+
+class GmpyBackend(PythonBackend):
+    """
+    GMP backed mpz integers. The operators are overloaded by mpz, so the algorithm code
+    does not care which backend produced its operands.
+    """
+    name = 'gmpy2'
+
+    def __init__(self):
+        super(GmpyBackend, self).__init__()
+        if gmpy2 is None:
+            raise ArithmeticBackendException('gmpy2 is not installed')
+
+    @staticmethod
+    def number(value):
+        return gmpy2.mpz(value)
+
+    @staticmethod
+    def square_mod(a, modulus):
+        return gmpy2.f_mod(gmpy2.square(a), modulus)
+
+    @staticmethod
+    def multiply_mod(a, b, modulus):
+        return gmpy2.f_mod(gmpy2.mul(a, b), modulus)
+
+    @staticmethod
+    def invert(a, modulus):
+        return gmpy2.invert(a, modulus)
+
+    @staticmethod
+    def pow_mod(base, exponent, modulus):
+        return gmpy2.powmod(base, exponent, modulus)
+
+    @staticmethod
+    def gcd(a, b):
+        return gmpy2.gcd(a, b)
+
+    @staticmethod
+    def is_probable_prime(candidate, rounds=40):
+        return gmpy2.is_prime(candidate, rounds)
+
+
+BACKENDS = {
+    PythonBackend.name: PythonBackend,
+    GmpyBackend.name: GmpyBackend,
+}
+
+
+def get_backend(name='auto'):
+    """
+    'auto' picks gmpy2 when it is installed and falls back to plain python integers otherwise.
+    """
+    if name == 'auto':
+        name = GmpyBackend.name if gmpy2 is not None else PythonBackend.name
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ArithmeticBackendException(f'Unknown arithmetic backend: {name}')
+
+
+def check_backends(bit_count=1024, rounds=20):
+    """
+    Checks that 'auto' falls back to plain python integers when gmpy2 is missing, and that every available backend
+    computes the same results on random operands. Returns the names of the backends compared.
+    """
+    global gmpy2
+    installed_gmpy2 = gmpy2
+    gmpy2 = None
+    try:
+        fallback = get_backend('auto').name
+    finally:
+        gmpy2 = installed_gmpy2
+    if fallback != PythonBackend.name:
+        raise ArithmeticBackendException(f"'auto' picked {fallback} without gmpy2")
+    expected = GmpyBackend.name if gmpy2 is not None else PythonBackend.name
+    if get_backend('auto').name != expected:
+        raise ArithmeticBackendException(f"'auto' picked {get_backend('auto').name} instead of {expected}")
+
+    backends = [get_backend(name) for name in BACKENDS if name == PythonBackend.name or gmpy2 is not None]
+    for _ in range(rounds):
+        modulus = random.getrandbits(bit_count) | (1 << (bit_count - 1)) | 1
+        a, b, exponent = (random.getrandbits(bit_count) for _ in range(3))
+        prime = backends[0].random_prime(bit_count // 2)
+        results = set()
+        for backend in backends:
+            n, x, y = backend.number(modulus), backend.number(a), backend.number(b)
+            results.add((
+                int(backend.square_mod(x, n)),
+                int(backend.multiply_mod(x, y, n)),
+                int(backend.pow_mod(x, backend.number(exponent), n)),
+                int(backend.invert(backend.number(2), n)),
+                int(backend.gcd(x, n)),
+                bool(backend.is_probable_prime(backend.number(prime))),
+                bool(backend.is_probable_prime(backend.number(prime) * 3)),
+            ))
+        if len(results) != 1:
+            raise ArithmeticBackendException(f'Backends {[backend.name for backend in backends]} disagree: {results}')
+
+    return [backend.name for backend in backends]
+
+
+# used by the static helpers of ModularExp when no backend is passed
+DEFAULT_BACKEND = get_backend()
+
+
+if __name__ == '__main__':
+    print(f'Arithmetic backends agree: {check_backends()}')
@@ -0,0 +1,198 @@
+import logging
+import random
+import time
+
+from instrumentation import instrumentation
+from modular_exp import ModularExp, ModularExpException
+
+
+logger = logging.getLogger(__name__)
+
+PUBLIC_EXPONENT = 65537
+
+
+class CrtRsaException(ModularExpException):
+    pass
+
+
+class CrtFaultDetectedException(CrtRsaException):
+    pass
+
+
+class CrtRsaExp(ModularExp):
+    """
+    RSA key mode of ModularExp, signing with CRT recombination.
+    `e` keeps its ModularExp meaning - the secret exponent (d) - so the inherited exponentiations and
+    C-safe error attacks run against a real private key. The public exponent is held in `public_e`.
+    """
+
+    def __init__(self, c, backend='auto', shamir_bit_count=32):
+        super(CrtRsaExp, self).__init__(c, backend)
+        self.public_e = PUBLIC_EXPONENT
+        self.shamir_bit_count = shamir_bit_count
+        self.p = 0
+        self.q = 0
+        self.dp = 0
+        self.dq = 0
+        self.qinv = 0
+
+    @property
+    def d(self):
+        return self.e
+
+    def _generate_rsa_key(self, bit_count):
+        p_bit_count = bit_count // 2
+        while True:
+            p = self.backend.random_prime(p_bit_count)
+            q = self.backend.random_prime(bit_count - p_bit_count)
+            phi = (p - 1) * (q - 1)
+            if p != q and self.backend.gcd(self.public_e, phi) == 1:
+                break
+        d = self.backend.invert(self.public_e, phi)
+
+        return p, q, d
+
+    @instrumentation.timed('crt_rsa.generate_random_numbers')
+    def generate_random_numbers(self):
+        print(f'Generating RSA key (p, q, d, dp, dq, qinv) with the {self.backend.name} arithmetic backend..')
+
+        self.p, self.q, self.e = self._generate_rsa_key(self.bit_count)
+        self.n = self.p * self.q
+        self.dp = self.e % (self.p - 1)
+        self.dq = self.e % (self.q - 1)
+        self.qinv = self.backend.invert(self.q, self.p)
+        self.a = self.backend.getrandbits(self.bit_count) % self.n     # the message to sign
+        self.r, self.r_inverse = self._calculate_R(self.n, self.backend)
+
+        logger.debug('Generated RSA Key:\nMESSAGE(A): %s\nP: %s\nQ: %s\nMODULUS(N): %s\nPUBLIC EXP: %s\n'
+                     'PRIVATE EXP(D): %s\nDP: %s\nDQ: %s\nQINV: %s\n',
+                     self.a, self.p, self.q, self.n, self.public_e, self.e, self.dp, self.dq, self.qinv)
+
+    def _half_exponentiation(self, base, exponent, modulus, inject_fault=False):
+        k_array = ModularExp._get_k_array(exponent)
+        if not inject_fault:
+            return self.basic_exponentiation(base % modulus, k_array, modulus)
+
+        return self.faulty_dummy_multiply_exponentiation(k_array, base % modulus, modulus,
+                                                         self._random_faulty_iteration(k_array))
+
+    def _crt_recombine(self, sp, sq):
+        # Garner: s = sq + q * (qinv * (sp - sq) mod p)
+        h = self._multiply_operation(self.qinv, (sp - sq) % self.p, self.p, self.backend)
+        return sq + h * self.q
+
+    @staticmethod
+    def _random_faulty_iteration(k_array):
+        """
+        A fault only corrupts the result if it hits a real multiplication, i.e. an iteration whose exponent bit
+        is set (iteration 0 is never computed by the right-to-left loop).
+        """
+        effective_iterations = [i for i in range(1, len(k_array)) if k_array[i] == '1']
+        if not effective_iterations:
+            raise CrtRsaException('Exponent has no faultable multiplication')
+
+        return random.choice(effective_iterations)
+
+    @instrumentation.timed('crt_rsa.crt_sign')
+    def crt_sign(self, message, inject_fault=False):
+        """
+        inject_fault glitches a single multiplication of the p half only.
+        """
+        sp = self._half_exponentiation(message, self.dp, self.p, inject_fault)
+        sq = self._half_exponentiation(message, self.dq, self.q)
+
+        return self._crt_recombine(sp, sq)
+
+    @instrumentation.timed('crt_rsa.verified_crt_sign')
+    def verified_crt_sign(self, message, inject_fault=False):
+        """
+        Countermeasure: verify the signature with the public exponent before releasing it.
+        """
+        signature = self.crt_sign(message, inject_fault)
+        if self.backend.pow_mod(signature, self.public_e, self.n) != message % self.n:
+            raise CrtFaultDetectedException('Signature verification failed, signature withheld')
+
+        return signature
+
+    @instrumentation.timed('crt_rsa.shamir_crt_sign')
+    def shamir_crt_sign(self, message, inject_fault=False):
+        """
+        Countermeasure (Shamir's trick): both halves are computed modulo p * r and q * r for a small random prime r.
+        Each half also yields message^d mod r, so a fault in one half shows up as a mismatch modulo r.
+        """
+        r = self.backend.random_prime(self.shamir_bit_count)
+        pr = self.p * r
+        qr = self.q * r
+        d_pr = self.e % ((self.p - 1) * (r - 1))
+        d_qr = self.e % ((self.q - 1) * (r - 1))
+
+        s_pr = self._half_exponentiation(message, d_pr, pr, inject_fault)
+        s_qr = self._half_exponentiation(message, d_qr, qr)
+        if s_pr % r != s_qr % r:
+            raise CrtFaultDetectedException('Shamir check failed, signature withheld')
+
+        return self._crt_recombine(s_pr % self.p, s_qr % self.q)
+
+    @instrumentation.timed('fault_campaign.bellcore_attack')
+    def bellcore_attack(self, sign=None):
+        """
+        Bellcore attack (Lenstra's variant, a single faulty signature and the known message):
+        a fault in the p half leaves the signature correct modulo q only, so gcd(s^e - m, n) = q.
+        Returns the recovered (p, q) factorization.
+        """
+        sign = sign or self.crt_sign
+        faulty_signature = sign(self.a, inject_fault=True)
+        factor = self.backend.gcd((self.backend.pow_mod(faulty_signature, self.public_e, self.n) - self.a) % self.n,
+                                  self.n)
+        if factor in (1, self.n):
+            raise CrtRsaException('Bellcore attack failed, the fault did not split the modulus')
+
+        return self.n // factor, factor
+
+    def run_project(self):
+        super(CrtRsaExp, self).run_project()
+
+        try:
+            print('CRT-RSA Signature Starts..')
+            del self.weights_trace[:]
+            start_time = time.time()
+            full_result = self.basic_exponentiation(self.a, self.k_array, self.n)
+            full_time_diff = time.time() - start_time
+            start_time = time.time()
+            crt_result = self.crt_sign(self.a)
+            crt_time_diff = time.time() - start_time
+            assert(crt_result == full_result)
+            print(
+                f'CRT Calculation Success!\n'
+                f'RESULT: {crt_result}\n'
+                f'FULL EXPONENTIATION TIME: {full_time_diff}[seconds]\n'
+                f'CRT EXECUTION TIME: {crt_time_diff}[seconds]\n'
+                f'SPEEDUP: {full_time_diff / crt_time_diff:.2f}x\n'
+            )
+        except Exception:
+            logger.exception('CRT-RSA signature failed..')
+
+        try:
+            print('Bellcore Fault Attack On CRT-RSA Starts..')
+            del self.weights_trace[:]
+            p, q = self.bellcore_attack()
+            assert(p * q == self.n and {p, q} == {self.p, self.q})        # SUCCESS!
+            print(f'Successfully factored the modulus with a single faulty signature:\n'
+                  f'P: {p}\n'
+                  f'Q: {q}\n')
+        except Exception:
+            logger.exception('Bellcore attack on CRT-RSA failed..')
+
+        for countermeasure_name, sign in (('Signature Verification', self.verified_crt_sign),
+                                          ('Shamir Trick', self.shamir_crt_sign)):
+            try:
+                print(f'Bellcore Fault Attack On CRT-RSA With {countermeasure_name} Starts..')
+                del self.weights_trace[:]
+                assert(sign(self.a) == self.crt_sign(self.a))
+                self.bellcore_attack(sign)
+                print(f'Fault was NOT detected by {countermeasure_name}!\n')
+            except CrtFaultDetectedException:
+                print(f'Couldnt factor the modulus with the Bellcore attack!\n'
+                      f'The fault was detected by {countermeasure_name}..\n')
+            except Exception:
+                logger.exception(f'Bellcore attack against {countermeasure_name} failed..')
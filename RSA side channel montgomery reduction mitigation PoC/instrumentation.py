@@ -0,0 +1,184 @@
+import contextlib
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+
+
+# A child of the modular_exp logger, so whatever handlers / levels are configured for modular_exp apply here too.
+# Other users of this module (the trace exploitation PoC) pass a logger of their own.
+logger = logging.getLogger('modular_exp.instrumentation')
+
+PROFILERS = ('cprofile', 'pyinstrument')
+
+
+class InstrumentationException(Exception):
+    pass
+
+
+class Instrumentation(object):
+    """
+    Named timers and counters around the hot paths (trace loading and parsing, hypothesis building, accumulation,
+    ranking, exponentiation loops, fault campaigns), summarized through logging by report().
+
+    Disabled by default, where timer() / timed() cost a single flag check. Without editing any script it can be
+    switched on with environment variables:
+        INSTRUMENTATION=1               collect timers and counters and log a report at the end of run()
+        INSTRUMENTATION_VERBOSE=1       also log every timed section as it finishes (implies INSTRUMENTATION=1)
+        INSTRUMENTATION_PROFILE=<path>  dump a profile of run() to path
+        INSTRUMENTATION_PROFILER=<name> one of PROFILERS, cprofile by default
+    """
+
+    def __init__(self, enabled=False, verbose=False, logger=logger):
+        super(Instrumentation, self).__init__()
+        self.logger = logger
+        self.enabled = False
+        self.verbose = False
+        self.timers = {}                    # name -> [calls, total seconds]
+        self.counters = {}                  # name -> count
+        self._lock = threading.Lock()       # timed sections may run in worker threads
+        if enabled or verbose:
+            self.enable(verbose)
+
+    @classmethod
+    def from_environment(cls, logger=logger):
+        verbose = os.environ.get('INSTRUMENTATION_VERBOSE', '0') not in ('', '0')
+        enabled = os.environ.get('INSTRUMENTATION', '0') not in ('', '0')
+
+        return cls(enabled, verbose, logger)
+
+    def enable(self, verbose=False):
+        self.enabled = True
+        self.verbose = verbose
+        # the reports are logged at INFO level, which an unconfigured logging setup would drop
+        self.logger.setLevel(logging.INFO)
+        if not logging.getLogger().handlers:
+            logging.basicConfig(format='%(message)s')
+
+    def disable(self):
+        self.enabled = False
+        self.verbose = False
+
+    def reset(self):
+        self.timers.clear()
+        self.counters.clear()
+
+    def _record(self, name, elapsed):
+        with self._lock:
+            timer = self.timers.setdefault(name, [0, 0.0])
+            timer[0] += 1
+            timer[1] += elapsed
+        if self.verbose:
+            self.logger.info('%s took %.6f[seconds]', name, elapsed)
+
+    @contextlib.contextmanager
+    def _timer(self, name):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, time.perf_counter() - start_time)
+
+    def timer(self, name):
+        """
+        Context manager timing its block under name.
+        """
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._timer(name)
+
+    def timed(self, name=None):
+        """
+        Decorator timing every call of the function under name (the function's qualified name by default).
+        """
+        def decorator(func):
+            timer_name = name if name is not None else func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start_time = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self._record(timer_name, time.perf_counter() - start_time)
+
+            return wrapper
+
+        return decorator
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + amount
+
+    def report(self):
+        """
+        Logs (and returns) the collected timers, slowest first, and counters.
+        """
+        lines = ['Instrumentation report:']
+        for name, (calls, total) in sorted(self.timers.items(), key=lambda item: item[1][1], reverse=True):
+            lines.append(f'{name}: {calls} calls, {total:.6f}[seconds] total, {total / calls:.6f}[seconds] mean')
+        for name, count in sorted(self.counters.items()):
+            lines.append(f'{name}: {count}')
+        self.logger.info('\n'.join(lines))
+
+        return {'timers': {name: tuple(timer) for name, timer in self.timers.items()}, 'counters': dict(self.counters)}
+
+    @contextlib.contextmanager
+    def profile(self, path, profiler='cprofile'):
+        """
+        Profiles the block and dumps the result to path: pstats data for cprofile, an html report for pyinstrument
+        (an optional dependency).
+        """
+        if profiler not in PROFILERS:
+            raise InstrumentationException(f'Unknown profiler {profiler}, expected one of {PROFILERS}')
+
+        if profiler == 'pyinstrument':
+            try:
+                import pyinstrument
+            except ImportError:
+                raise InstrumentationException('pyinstrument is not installed, use the cprofile profiler instead')
+            session = pyinstrument.Profiler()
+            session.start()
+            try:
+                yield
+            finally:
+                session.stop()
+                with open(path, 'w') as f:
+                    f.write(session.output_html())
+                self.logger.info('pyinstrument profile written to %s', path)
+            return
+
+        session = cProfile.Profile()
+        session.enable()
+        try:
+            yield
+        finally:
+            session.disable()
+            session.dump_stats(path)
+            summary = io.StringIO()
+            pstats.Stats(session, stream=summary).sort_stats('cumulative').print_stats(20)
+            self.logger.info('cProfile profile written to %s, top functions:\n%s', path, summary.getvalue())
+
+    def run(self, func, *args, **kwargs):
+        """
+        Runs func under the profiler requested by the environment (if any), then logs the report when enabled.
+        """
+        profile_path = os.environ.get('INSTRUMENTATION_PROFILE')
+        profiler = os.environ.get('INSTRUMENTATION_PROFILER', 'cprofile')
+        context = self.profile(profile_path, profiler) if profile_path else contextlib.nullcontext()
+        try:
+            with context:
+                return func(*args, **kwargs)
+        finally:
+            if self.enabled:
+                self.report()
+
+
+instrumentation = Instrumentation.from_environment()
@@ -1,4 +1,7 @@
+import argparse
 import modular_exp
+import crt_rsa
+from instrumentation import instrumentation
 import time
 import matplotlib.pyplot as plt
 
@@ -116,7 +119,19 @@ def measure_montgomery_operation_trace():
     print(f'Resulting Trace:\n'
           f'{mod.weights_trace}')
 
+def run_crt_rsa_project(bit_count=2048):
+    mod = crt_rsa.CrtRsaExp(c=bit_count)
+    mod.generate_random_numbers()
+    mod.run_project()
+
 def main():
+    parser = argparse.ArgumentParser(description='Modular exponentiation side channel and fault attack simulator')
+    parser.add_argument('--crt-rsa', action='store_true',
+                        help='Run the CRT-RSA signature and Bellcore fault attack demo instead of the plain project')
+    parser.add_argument('-c', '--bit-count', type=int, default=None,
+                        help='Operand / RSA modulus size in bits (default: 2000, 2048 with --crt-rsa)')
+    args = parser.parse_args()
+
     print(f'Hello, Welcome to Itay & Eviatar project.\n'
           f'This is a simulator for hardware-security Project 1'
           f'We will simulate multiple variants of modular exponentiation techniques.\n')
@@ -127,11 +142,15 @@ def main():
     # measure_dummy_operation_trace()
     # measure_time_execution_to_hamming_weight_dependency_montgomery_operation()
     # measure_montgomery_operation_trace()
+    if args.crt_rsa:
+        run_crt_rsa_project(args.bit_count or 2048)
+        return
 
-    mod = modular_exp.ModularExp(c=2000)
+    mod = modular_exp.ModularExp(c=args.bit_count or 2000)
     mod.generate_random_numbers()
     mod.run_project()
 
 
 if __name__ == '__main__':
-    main()
+    # INSTRUMENTATION=1 / INSTRUMENTATION_PROFILE=<path> report where the run spent its time, see instrumentation.py
+    instrumentation.run(main)
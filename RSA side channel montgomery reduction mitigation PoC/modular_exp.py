@@ -1,7 +1,8 @@
 import logging
-import random
 import time
-from math import log, ceil
+
+from arithmetic_backend import DEFAULT_BACKEND, get_backend
+from instrumentation import instrumentation
 
 
 logger = logging.getLogger(__name__)
@@ -14,9 +15,10 @@ class ModularExpException(Exception):
 class ModularExp(object):
     hamming_weight_time_dependency = []
 
-    def __init__(self, c):
+    def __init__(self, c, backend='auto'):
         super(ModularExp, self).__init__()
         self.bit_count = c
+        self.backend = get_backend(backend)
         self.a = 0
         self.e = 0
         self.n = 0
@@ -28,85 +30,90 @@ class ModularExp(object):
 
     @property
     def k_array(self):
-        return list(bin(self.e)[len('0b'):])[::-1]
+        return ModularExp._get_k_array(self.e)
+
+    @staticmethod
+    def _get_k_array(exponent):
+        return list(bin(exponent)[len('0b'):])[::-1]
 
     @staticmethod
-    def _square_operation(a, modulus):
-        return ((a * a) % modulus)
+    def _square_operation(a, modulus, backend=DEFAULT_BACKEND):
+        return backend.square_mod(a, modulus)
 
     @staticmethod
-    def _multiply_operation(a, b, modulus):
-        return ((a * b) % modulus)
+    def _multiply_operation(a, b, modulus, backend=DEFAULT_BACKEND):
+        return backend.multiply_mod(a, b, modulus)
 
     @staticmethod
     def _faulty_operation(a, b):
         return ((a ^ b) ^ 0x1337)
 
     @staticmethod
-    def _generate_random_triplet(bit_count):
-        a = random.getrandbits(bit_count)
-        b = random.getrandbits(bit_count)
+    def _generate_random_triplet(bit_count, backend=DEFAULT_BACKEND):
+        a = backend.getrandbits(bit_count)
+        b = backend.getrandbits(bit_count)
         c = 0
         while c % 2 == 0:
-            c = random.getrandbits(bit_count)                   # n must be odd for montgomery
+            c = backend.getrandbits(bit_count)                  # n must be odd for montgomery
 
         return a, b, c
 
     @staticmethod
-    def _calculate_R(modulus):
-        r = pow(2, ceil(log(modulus) / log(2)))
-        r_inverse = pow(r, -1, modulus)
+    def _calculate_R(modulus, backend=DEFAULT_BACKEND):
+        # The smallest power of 2 above the (odd) modulus, computed exactly instead of through float log
+        r = backend.number(1) << int(modulus).bit_length()
+        r_inverse = backend.invert(r, modulus)
 
         return r, r_inverse
 
+    @instrumentation.timed('modular_exp.generate_random_numbers')
     def generate_random_numbers(self):
-        print('Generating random parameters (a, e, n)..')
+        print(f'Generating random parameters (a, e, n) with the {self.backend.name} arithmetic backend..')
 
-        self.a, self.e, self.n = ModularExp._generate_random_triplet(self.bit_count)
-        self.r, self.r_inverse = ModularExp._calculate_R(self.n)
+        self.a, self.e, self.n = self._generate_random_triplet(self.bit_count, self.backend)
+        self.r, self.r_inverse = self._calculate_R(self.n, self.backend)
 
-        print(f'Generated Random Parameters:\n'
-              f'A: {self.a}\n'
-              f'EXP: {self.e}\n'
-              f'EXP BITS: {bin(self.e)}\n'
-              f'MODULUS(N): {self.n}\n'
-              f'R: {self.r}\n'
-              f'R_INVERSE: {self.r_inverse}\n')
+        # the full numbers are only rendered when debug logging is on - they run to thousands of digits
+        logger.debug('Generated Random Parameters:\nA: %s\nEXP: %s\nMODULUS(N): %s\nR: %s\nR_INVERSE: %s\n',
+                     self.a, self.e, self.n, self.r, self.r_inverse)
 
+    @instrumentation.timed('modular_exp.basic_exponentiation')
     def basic_exponentiation(self, base, k_array, modulus):
         b = base ** int(k_array[0])
         c = base
         for i in range(1, len(k_array)):
-            c = ModularExp._square_operation(c, modulus)
+            c = self._square_operation(c, modulus, self.backend)
             self.weights_trace.append(50)  # holds for square weight
             if k_array[i] == '1':
-                b = ModularExp._multiply_operation(b, c, modulus)
+                b = self._multiply_operation(b, c, modulus, self.backend)
                 self.weights_trace.append(100)  # holds for multiply weight
 
         return b
 
+    @instrumentation.timed('modular_exp.dummy_multiply_exponentiation')
     def dummy_multiply_exponentiation(self, base, k_array, modulus):
         b = [0, 0]
         b[0] = base ** int(k_array[0])
 
         c = base
         for i in range(1, len(k_array)):
-            c = ModularExp._square_operation(c, modulus)
+            c = self._square_operation(c, modulus, self.backend)
             self.weights_trace.append(50)
-            b[(1 - int(k_array[i]))] = ModularExp._multiply_operation(b[0], c, modulus)
+            b[(1 - int(k_array[i]))] = self._multiply_operation(b[0], c, modulus, self.backend)
             self.weights_trace.append(100)
 
         return b[0]
 
+    @instrumentation.timed('modular_exp.faulty_dummy_multiply_exponentiation')
     def faulty_dummy_multiply_exponentiation(self, k_array, base, modulus, faulty_iteration):
         b = [0, 0]
         b[0] = base ** int(k_array[0])
         c = base
         for i in range(1, len(k_array)):
-            c = ModularExp._square_operation(c, modulus)
+            c = self._square_operation(c, modulus, self.backend)
             self.weights_trace.append(50)
             if i != faulty_iteration:
-                b[(1 - int(k_array[i]))] = ModularExp._multiply_operation(b[0], c, modulus)
+                b[(1 - int(k_array[i]))] = self._multiply_operation(b[0], c, modulus, self.backend)
             else:
                 b[(1 - int(k_array[i]))] = ModularExp._faulty_operation(b[0], c)
             self.weights_trace.append(100)
@@ -114,13 +121,15 @@ class ModularExp(object):
         return b[0]
 
     def montgomery_multiply(self, a, b):
-        a_tag = ((a * self.r) % self.n)
-        b_tag = ((b * self.r) % self.n)
-        c_tag = (((a_tag * b_tag) * self.r_inverse) % self.n)
-        c = ((c_tag * self.r_inverse) % self.n)
+        a_tag = self._multiply_operation(a, self.r, self.n, self.backend)
+        b_tag = self._multiply_operation(b, self.r, self.n, self.backend)
+        ab_tag = self._multiply_operation(a_tag, b_tag, self.n, self.backend)
+        c_tag = self._multiply_operation(ab_tag, self.r_inverse, self.n, self.backend)
+        c = self._multiply_operation(c_tag, self.r_inverse, self.n, self.backend)
 
         return c
 
+    @instrumentation.timed('modular_exp.montgomery_exponentiation')
     def montgomery_exponentiation(self, k_array, base):
         R_0 = 1
         R_1 = base
@@ -139,6 +148,7 @@ class ModularExp(object):
 
         return R_0
 
+    @instrumentation.timed('modular_exp.faulty_montgomery_exponentiation')
     def faulty_montgomery_exponentiation(self, k_array, base, faulty_iteration):
         R_0 = 1
         R_1 = base
@@ -239,7 +249,9 @@ class ModularExp(object):
         except Exception:
             ModularExpException('C-safe error attack on dummy multiplication basic exponentiation failed..')
 
+    @instrumentation.timed('fault_campaign.c_safe_error_attack')
     def c_safe_error_attack(self):
+        instrumentation.count('fault_campaign.faulty_runs', self.bit_count)
         original_output = self.dummy_multiply_exponentiation(self.a, self.k_array, self.n)
         restored_key = ''
         for i in range(self.bit_count):   # The multiplication algorithm skips iteration 0, assumes LSB == '0' for now
@@ -260,7 +272,9 @@ class ModularExp(object):
 
         return restored_key
 
+    @instrumentation.timed('fault_campaign.c_safe_error_attack_montgomery')
     def c_safe_error_attack_montgomery_failure(self):
+        instrumentation.count('fault_campaign.faulty_runs', self.bit_count)
         original_output = self.montgomery_exponentiation(self.k_array, self.a)
         restored_key = ''
         for i in range(self.bit_count):  # The multiplication algorithm skips iteration 0, assumes LSB == '0' for now
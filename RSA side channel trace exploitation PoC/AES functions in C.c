@@ -1,5 +1,7 @@
 #include <stdio.h>
+#ifdef _WIN32
 #include<conio.h>
+#endif
 #include <stdlib.h>
 #include <string.h>
 
@@ -8,6 +10,7 @@
 #define Nr 10           ///// Do not change this parameters
 #define NSAMPLES 5000   
 #define TARGETBYTE 0    ///// You can put your choice of targetbyte here.
+#define NLEAKAGE 12     ///// leakage points per trace: plaintext, first round key and 10 rounds
 
 
 
@@ -29,6 +32,9 @@ int doPrint;
 
 int inv_sbox[256]; 
 
+unsigned char* leakedStates = NULL;   /// batch mode: NLEAKAGE * 16 state bytes of the current trace
+int leakedRound;
+
 int getSBoxValue(int num)
 {
 	int sbox[256] =   {
@@ -266,6 +272,20 @@ void leakStateValues(FILE* fd)
 {
 	int i,j;
 
+	if(leakedStates != NULL){
+		for(i=0;i<4;i++)
+		{
+			for(j=0;j<4;j++)
+			{
+				leakedStates[16 * leakedRound + 4 * i + j] = state[j][i];
+			}
+		}
+		leakedRound++;
+	}
+	if(fd == NULL){
+		return;
+	}
+
 	for(i=0;i<4;i++)
 	{
 		for(j=0;j<4;j++)
@@ -493,6 +513,45 @@ void SimulatePowerTraces()
 	// return 0;
 }
 
+// Batch entry point for the python binding (aes_leakage.py): encrypts n plaintexts of 16 bytes under key and
+// writes, per trace, the ciphertext (16 bytes), the NLEAKAGE leaked states (NLEAKAGE * 16 bytes, the order of
+// leakStateValues) and their NLEAKAGE Hamming weights (ComputeHammingWeight) into the caller's buffers.
+// Any output buffer may be NULL. Uses the global AES state, so it is not thread safe.
+int EncryptBatch(const unsigned char* key, const unsigned char* plaintexts, int n,
+                 unsigned char* ciphertexts, unsigned char* states, int* hammingWeights)
+{
+	int i,j;
+
+	for(i = 0; i < Nk * 4; i++){
+		Key[i] = key[i];
+	}
+	KeyExpansion();
+	doPrint = 0;
+
+	for(i = 0; i < n; i++){
+		resetPowerTrace();
+		memcpy(in, plaintexts + 16 * i, 16);
+		leakedStates = states != NULL ? states + NLEAKAGE * 16 * i : NULL;
+		leakedRound = 0;
+
+		Cipher(NULL);
+
+		if(ciphertexts != NULL){
+			memcpy(ciphertexts + 16 * i, out, 16);
+		}
+		if(hammingWeights != NULL){
+			for(j = 0; j < NLEAKAGE; j++){
+				hammingWeights[NLEAKAGE * i + j] = PowerTrace[j];
+			}
+		}
+	}
+	leakedStates = NULL;
+
+	return 0;
+}
+
+// Build with -DAES_LIBRARY to get a shared library without the standalone program
+#ifndef AES_LIBRARY
 int main()
 {
 
@@ -500,3 +559,4 @@ int main()
 	SimulatePowerTraces();
 	return 0;
 }
+#endif
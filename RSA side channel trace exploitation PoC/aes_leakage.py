@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+ctypes binding of "AES functions in C.c": batch AES-128 encryption that writes the leaked round states and their
+Hamming weights straight into NumPy arrays, instead of going through the text files of the standalone program.
+
+The shared library is compiled from the C source on first use (and whenever the source is newer than it).
+"""
+
+import ctypes
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+AES_SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "AES functions in C.c")
+AES_LIBRARY_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "libaes_leakage" + (".dll" if sys.platform == "win32" else ".so")
+)
+LEAKAGE_POINTS = 12     # NLEAKAGE: plaintext, first round key and 10 rounds
+BLOCK_BYTES = 16
+
+_library = None
+
+
+def build_library(source_path=AES_SOURCE_PATH, library_path=AES_LIBRARY_PATH, compiler=None):
+    compiler = compiler if compiler is not None else os.environ.get("CC", "gcc")
+    command = [compiler, "-O2", "-shared", "-fPIC", "-DAES_LIBRARY", source_path, "-o", library_path]
+    subprocess.run(command, check=True)
+
+    return library_path
+
+
+def load_library(library_path=AES_LIBRARY_PATH, source_path=AES_SOURCE_PATH):
+    global _library
+    if _library is not None:
+        return _library
+
+    if not os.path.exists(library_path) or os.path.getmtime(library_path) < os.path.getmtime(source_path):
+        build_library(source_path, library_path)
+
+    library = ctypes.CDLL(library_path)
+    bytes_pointer = np.ctypeslib.ndpointer(dtype=np.uint8, flags="C_CONTIGUOUS")
+    optional_bytes_pointer = ctypes.c_void_p
+    library.EncryptBatch.argtypes = [
+        bytes_pointer, bytes_pointer, ctypes.c_int, optional_bytes_pointer, optional_bytes_pointer,
+        optional_bytes_pointer,
+    ]
+    library.EncryptBatch.restype = ctypes.c_int
+    _library = library
+
+    return library
+
+
+def _check_buffer(name, buffer, shape, dtype):
+    if buffer is None:
+        return np.empty(shape, dtype=dtype)
+    if buffer.shape != shape or buffer.dtype != dtype or not buffer.flags["C_CONTIGUOUS"]:
+        raise ValueError("%s must be a C contiguous %s array of shape %s" % (name, np.dtype(dtype).name, shape))
+
+    return buffer
+
+
+def _address(buffer):
+    return buffer.ctypes.data_as(ctypes.c_void_p)
+
+
+def encrypt_batch(key, plaintexts, ciphertexts=None, states=None, hamming_weights=None):
+    """
+    Encrypts plaintexts (uint8 array of shape (n, 16)) under key (16 bytes).
+    Fills, and returns, the caller's buffers - or new arrays for the ones that are None:
+        ciphertexts: uint8 (n, 16)
+        states: uint8 (n, 12, 16) - the state leaked after each of the 12 leakage points, in leakStateValues order
+        hamming_weights: int32 (n, 12) - ComputeHammingWeight of each leakage point
+    """
+    library = load_library()
+    key = np.ascontiguousarray(np.frombuffer(bytes(key), dtype=np.uint8) if isinstance(key, (bytes, bytearray))
+                               else np.asarray(key, dtype=np.uint8))
+    if key.shape != (BLOCK_BYTES,):
+        raise ValueError("key must hold %d bytes" % BLOCK_BYTES)
+    plaintexts = np.ascontiguousarray(plaintexts, dtype=np.uint8)
+    if plaintexts.ndim != 2 or plaintexts.shape[1] != BLOCK_BYTES:
+        raise ValueError("plaintexts must be of shape (n, %d)" % BLOCK_BYTES)
+    n = len(plaintexts)
+
+    ciphertexts = _check_buffer("ciphertexts", ciphertexts, (n, BLOCK_BYTES), np.uint8)
+    states = _check_buffer("states", states, (n, LEAKAGE_POINTS, BLOCK_BYTES), np.uint8)
+    hamming_weights = _check_buffer("hamming_weights", hamming_weights, (n, LEAKAGE_POINTS), np.int32)
+    library.EncryptBatch(key, plaintexts, n, _address(ciphertexts), _address(states), _address(hamming_weights))
+
+    return ciphertexts, states, hamming_weights
+
+
+def generate_traces(key, n, noise=0.0, rng=None, chunk_size=100000):
+    """
+    n random plaintexts, their ciphertexts and simulated traces: the 12 Hamming weight leakage points plus
+    Gaussian noise of the given standard deviation (float array of shape (n, 12)).
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    plaintexts = rng.integers(0, 256, (n, BLOCK_BYTES), dtype=np.uint8)
+    ciphertexts = np.empty((n, BLOCK_BYTES), dtype=np.uint8)
+    hamming_weights = np.empty((n, LEAKAGE_POINTS), dtype=np.int32)
+    # the round states are not returned, so they only need a chunk sized scratch buffer
+    states = np.empty((min(n, chunk_size), LEAKAGE_POINTS, BLOCK_BYTES), dtype=np.uint8)
+    for start in range(0, n, chunk_size):
+        stop = min(n, start + chunk_size)
+        encrypt_batch(key, plaintexts[start:stop], ciphertexts[start:stop], states[:stop - start],
+                      hamming_weights[start:stop])
+
+    traces = hamming_weights.astype(float)
+    if noise:
+        traces += rng.normal(0.0, noise, traces.shape)
+
+    return plaintexts, ciphertexts, traces
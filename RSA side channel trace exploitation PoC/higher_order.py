@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+Second-order DoM / CPA on one AES last round key byte, for masked implementations where the intermediate value
+only leaks jointly through two samples (the mask and the masked value).
+
+Every pair of samples (i, j), i < j, of a POI window is combined into a single feature:
+    product - (x_i - mean_i) * (x_j - mean_j), the centered product (needs a first pass for the means)
+    absdiff - |x_i - x_j|
+and the features are streamed into the first-order DomEngine / CpaEngine accumulators.
+
+The pair space grows quadratically with the window, so it is cut into square tiles of tile_size x tile_size sample
+pairs. The trace file is parsed once into memory mapped .npy files (see ArrayTraceDataset), which every later pass
+reads. Per chunk of traces the key guess hypotheses are built once, and the tiles are combined and accumulated with
+them in parallel threads (the NumPy matmuls release the GIL). Tiles are only built for the pass that uses them, and
+a pass holds as many tiles (accumulators and pair indices) as fit in max_memory: every tile is reduced to its best
+score per key guess once its pass is done. Beyond max_memory, memory only depends on chunk_size, tile_size and the
+number of workers (one combined chunk_size x tile_size^2 block per thread), whatever the number of traces and the
+window length.
+
+There is one worker thread per CPU by default. Each worker's matmuls are limited to a single BLAS thread while the
+pool runs, so that workers x BLAS threads does not oversubscribe the CPUs. This needs threadpoolctl (optional).
+Without it, set OMP_NUM_THREADS / OPENBLAS_NUM_THREADS / MKL_NUM_THREADS=1 before running.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import os
+import tempfile
+import warnings
+
+import numpy as np
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+from trace_dataset import KEY_GUESSES, ArrayTraceDataset, CpaEngine, DomEngine, TraceDataset, instrumentation
+
+COMBINING_FUNCTIONS = ("product", "absdiff")
+# engine class, (engine -> distinguisher score of shape (256, features))
+DISTINGUISHERS = {
+    "dom": (DomEngine, lambda engine: engine.get_dom()),
+    "cpa": (CpaEngine, lambda engine: np.abs(engine.get_correlation())),
+}
+
+
+class PairTile(object):
+    """
+    The sample pairs (i, j), i < j, of rows x columns, two (start, stop) ranges of sample indices. A tile on the
+    diagonal (rows == columns) only holds the upper triangle, and only such a tile needs an index array.
+    """
+
+    def __init__(self, rows, columns):
+        self.rows = slice(*rows)
+        self.columns = slice(*columns)
+        self.width = columns[1] - columns[0]
+        self.diagonal = rows == columns
+        self.positions = None
+        if self.diagonal:
+            # positions of the upper triangle pairs in the flattened rows x columns block
+            self.positions = np.flatnonzero(np.triu(np.ones((self.width, self.width), dtype=bool), 1))
+
+    @staticmethod
+    def count_pairs(rows, columns):
+        if rows == columns:
+            return (rows[1] - rows[0]) * (rows[1] - rows[0] - 1) // 2
+        return (rows[1] - rows[0]) * (columns[1] - columns[0])
+
+    def __len__(self):
+        return len(self.positions) if self.diagonal else (self.rows.stop - self.rows.start) * self.width
+
+    def get_pairs(self, features):
+        """
+        (first, second) sample indices of the given features of the tile.
+        """
+        positions = self.positions[features] if self.diagonal else features
+        return self.rows.start + positions // self.width, self.columns.start + positions % self.width
+
+    def combine(self, samples, combining_function):
+        """
+        Combined features of the tile's pairs: array of shape (n, len(self)), in (first, second) order.
+        samples must already be centered for the product.
+        """
+        first = samples[:, self.rows][:, :, np.newaxis]
+        second = samples[:, self.columns][:, np.newaxis, :]
+        if combining_function == "product":
+            block = first * second
+        else:
+            block = np.abs(first - second)
+        block = block.reshape(len(samples), -1)
+
+        return block[:, self.positions] if self.diagonal else block
+
+
+class SecondOrderAttack(object):
+    """
+    window: (start, stop) of the POI window in the dataset's samples, all of them by default.
+    max_memory: bytes allowed for the tiles (accumulators and pair indices) of one pass over the dataset.
+    workers: threads updating the tiles of a chunk, one per CPU by default (see above for the BLAS threads).
+    scratch_dir: where the .npy copy of a text dataset is written for the run (the system temp dir by default).
+    """
+
+    def __init__(self, dataset, byte_index, distinguisher="cpa", combining_function="product", window=None,
+                 hamming_distance=False, tile_size=32, max_memory=512 * 2 ** 20, workers=None, scratch_dir=None):
+        if distinguisher not in DISTINGUISHERS:
+            raise ValueError("Unknown distinguisher %s, expected one of %s" % (distinguisher, list(DISTINGUISHERS)))
+        if combining_function not in COMBINING_FUNCTIONS:
+            raise ValueError("Unknown combining function %s, expected one of %s"
+                             % (combining_function, list(COMBINING_FUNCTIONS)))
+        self.dataset = dataset
+        self.byte_index = byte_index
+        self.distinguisher = distinguisher
+        self.combining_function = combining_function
+        self.window = window if window is not None else (0, dataset.wlen)
+        if not 0 <= self.window[0] < self.window[1] - 1 < dataset.wlen:
+            raise ValueError("The window %s must hold at least 2 of the %d samples" % (self.window, dataset.wlen))
+        self.hamming_distance = hamming_distance
+        self.tile_size = tile_size
+        self.max_memory = max_memory
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.scratch_dir = scratch_dir
+        window_length = self.window[1] - self.window[0]
+        self.pairs = window_length * (window_length - 1) // 2
+        self.means = None
+        # best score of every key guess and the (i, j) sample pair it was reached at
+        self.scores = np.full(KEY_GUESSES, -np.inf)
+        self.best_pairs = np.zeros((KEY_GUESSES, 2), dtype=int)
+        self.passes = 0
+
+    def iter_blocks(self):
+        """
+        (rows, columns) sample ranges of every tile with at least one pair, generated from the block offsets.
+        """
+        start, stop = self.window
+        for row_start in range(start, stop, self.tile_size):
+            rows = (row_start, min(row_start + self.tile_size, stop))
+            for column_start in range(row_start, stop, self.tile_size):
+                columns = (column_start, min(column_start + self.tile_size, stop))
+                if PairTile.count_pairs(rows, columns):
+                    yield rows, columns
+
+    def iter_passes(self):
+        """
+        The tile ranges of every pass, grouped so the tiles of a pass fit in max_memory (at least one per pass).
+        """
+        # per pair: (256 + 2) float64 sums of the CPA engine ((256 + 1) for the DoM one), plus the int64 position
+        # of the diagonal tiles
+        pair_bytes = (KEY_GUESSES + 3) * np.dtype(float).itemsize
+        blocks, blocks_bytes = [], 0
+        for rows, columns in self.iter_blocks():
+            tile_bytes = PairTile.count_pairs(rows, columns) * pair_bytes
+            if blocks and blocks_bytes + tile_bytes > self.max_memory:
+                yield blocks
+                blocks, blocks_bytes = [], 0
+            blocks.append((rows, columns))
+            blocks_bytes += tile_bytes
+        if blocks:
+            yield blocks
+
+    @instrumentation.timed("second_order.means")
+    def get_means(self, chunk_size=1000, dataset=None):
+        dataset = dataset if dataset is not None else self.dataset
+        total = np.zeros(dataset.wlen)
+        traces = 0
+        for _, samples in dataset.iter_chunks(chunk_size):
+            total += samples.sum(axis=0)
+            traces += len(samples)
+        if not traces:
+            raise ValueError("No traces in %s" % dataset.path)
+
+        return total / traces
+
+    @instrumentation.timed("second_order.convert")
+    def _get_array_dataset(self, directory, chunk_size):
+        if isinstance(self.dataset, ArrayTraceDataset):
+            return self.dataset
+        return ArrayTraceDataset.from_dataset(self.dataset, directory, chunk_size)
+
+    def _limit_blas_threads(self):
+        if self.workers <= 1:
+            return contextlib.nullcontext()
+        if threadpool_limits is None:
+            warnings.warn("threadpoolctl is not installed, so the BLAS threads of the %d workers are not limited"
+                          % self.workers, RuntimeWarning)
+            return contextlib.nullcontext()
+        return threadpool_limits(limits=1, user_api="blas")
+
+    def _update_tile(self, engine, tile, ciphertexts, samples, hypotheses):
+        with instrumentation.timer("second_order.combine"):
+            features = tile.combine(samples, self.combining_function)
+        engine.update(ciphertexts, features, hypotheses)
+
+    def _reduce_tile(self, engine, tile):
+        scores = DISTINGUISHERS[self.distinguisher][1](engine)
+        best_features = np.argmax(scores, axis=1)
+        best_scores = scores[np.arange(KEY_GUESSES), best_features]
+        improved = best_scores > self.scores
+        self.scores[improved] = best_scores[improved]
+        self.best_pairs[improved, 0], self.best_pairs[improved, 1] = tile.get_pairs(best_features[improved])
+
+    def _run_pass(self, dataset, executor, blocks, chunk_size):
+        """
+        One pass over dataset for the tiles of blocks, in this thread if executor is None. The tiles and their
+        accumulators only live in this call, so they are released before the next pass builds its own.
+        """
+        engine_class = DISTINGUISHERS[self.distinguisher][0]
+        tiles = [PairTile(rows, columns) for rows, columns in blocks]
+        engines = [engine_class(len(tile), self.byte_index, self.hamming_distance) for tile in tiles]
+        for ciphertexts, samples in dataset.iter_chunks(chunk_size):
+            if self.means is not None:
+                samples = samples - self.means
+            # the hypotheses only depend on the chunk, so every tile shares them
+            with instrumentation.timer("second_order.hypotheses"):
+                hypotheses = engines[0].get_hypotheses(ciphertexts)
+            if executor is None:
+                for engine, tile in zip(engines, tiles):
+                    self._update_tile(engine, tile, ciphertexts, samples, hypotheses)
+                continue
+            futures = [
+                executor.submit(self._update_tile, engine, tile, ciphertexts, samples, hypotheses)
+                for engine, tile in zip(engines, tiles)
+            ]
+            for future in futures:
+                future.result()
+        for engine, tile in zip(engines, tiles):
+            self._reduce_tile(engine, tile)
+        instrumentation.count("second_order.pairs", sum(len(tile) for tile in tiles))
+        self.passes += 1
+
+    @instrumentation.timed("second_order.run")
+    def run(self, chunk_size=1000):
+        with tempfile.TemporaryDirectory(prefix="second_order_", dir=self.scratch_dir) as directory:
+            dataset = self._get_array_dataset(directory, chunk_size)
+            if self.combining_function == "product" and self.means is None:
+                self.means = self.get_means(chunk_size, dataset)
+            if self.workers <= 1:
+                for blocks in self.iter_passes():
+                    self._run_pass(dataset, None, blocks, chunk_size)
+            else:
+                with self._limit_blas_threads(), ThreadPoolExecutor(self.workers) as executor:
+                    for blocks in self.iter_passes():
+                        self._run_pass(dataset, executor, blocks, chunk_size)
+            # the memory maps of the .npy files are released before the directory is removed
+            del dataset
+
+        return self
+
+    def get_ranking(self):
+        """
+        Key guesses, most likely first.
+        """
+        return np.argsort(self.scores)[::-1]
+
+    def get_key_byte(self):
+        return int(np.argmax(self.scores))
+
+
+###############################################################################
+myfile = "DATA_from_keyset_9.csv"
+byte_index = 0
+poi_window = (0, 200)  # sample points, relative to the dataset window, holding both the mask and the masked value
+number_of_traces = 8940
+
+
+def main():
+    dataset = TraceDataset(myfile, max_traces=number_of_traces)
+    attack = SecondOrderAttack(dataset, byte_index, distinguisher="cpa", combining_function="product",
+                               window=poi_window, hamming_distance=True)
+    attack.run()
+    key_byte = attack.get_key_byte()
+    print("correct_key_byte=" + str(key_byte))
+    print("best sample pair: " + str(attack.best_pairs[key_byte].tolist()))
+    print("top 5 guesses: " + str(attack.get_ranking()[:5].tolist()))
+
+
+if __name__ == '__main__':
+    instrumentation.run(main)
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Timers, counters and profiling hooks for the trace attack scripts.
+
+The implementation lives in the modular exponentiation PoC (instrumentation.py there), whose modules import it
+directly. This module only loads that file by its path and gives the trace scripts their own Instrumentation,
+logging under trace_dataset.instrumentation, so both PoCs share one implementation without touching sys.path.
+"""
+
+import importlib.util
+import logging
+import os
+import sys
+
+_IMPLEMENTATION_NAME = "_modular_exp_instrumentation"
+_IMPLEMENTATION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                                    "RSA side channel montgomery reduction mitigation PoC", "instrumentation.py")
+
+
+def _load_implementation():
+    implementation = sys.modules.get(_IMPLEMENTATION_NAME)
+    if implementation is None:
+        spec = importlib.util.spec_from_file_location(_IMPLEMENTATION_NAME, _IMPLEMENTATION_PATH)
+        implementation = importlib.util.module_from_spec(spec)
+        # registered like a regular import, so the classes pickle and the file is only executed once
+        sys.modules[_IMPLEMENTATION_NAME] = implementation
+        spec.loader.exec_module(implementation)
+
+    return implementation
+
+
+_implementation = _load_implementation()
+PROFILERS = _implementation.PROFILERS
+Instrumentation = _implementation.Instrumentation
+InstrumentationException = _implementation.InstrumentationException
+
+instrumentation = Instrumentation.from_environment(logging.getLogger("trace_dataset.instrumentation"))
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+Profiled (template) attack on one AES last round key byte.
+
+Profiling uses traces of a device with a known key: the leakage classes (Hamming weight or full value of the
+last round intermediate InvSbox[ct ^ kb]) are computed for every trace, points of interest (POIs) are picked by
+their signal to noise ratio, and a multivariate Gaussian template (per class mean, pooled covariance) is fitted
+on them. The attack then scores all 256 guesses of the target's key byte by the summed log-likelihood of its
+traces.
+"""
+
+import numpy as np
+
+try:
+    from scipy.linalg import solve_triangular
+except ImportError:
+    solve_triangular = None
+
+from trace_dataset import HAMMING_WEIGHT, TraceDataset, instrumentation, last_round_intermediates
+
+LEAKAGE_MODELS = {
+    "hw": (9, lambda intermediates: HAMMING_WEIGHT[intermediates]),
+    "value": (256, lambda intermediates: intermediates),
+}
+
+
+class Template(object):
+    """
+    Gaussian templates on the POIs: means of shape (classes, pois) and one covariance pooled over all classes.
+    With a shared covariance the normalization term is the same for every class, so it is left out of the
+    log-likelihood, and the Cholesky factor is computed once and whitens every trace batch with a single triangular
+    solve (scipy's solve_triangular when installed, np.linalg.solve otherwise), without forming its inverse.
+    """
+
+    def __init__(self, pois, means, covariance, byte_index, leakage_model="hw"):
+        self.pois = np.asarray(pois)
+        self.means = np.asarray(means, dtype=float)
+        self.covariance = np.asarray(covariance, dtype=float)
+        self.byte_index = byte_index
+        self.leakage_model = leakage_model
+        # covariance = L @ L.T, so |L^-1 (x - mu)|^2 is the Mahalanobis distance of x from mu
+        self.cholesky = np.linalg.cholesky(self.covariance)
+        self.whitened_means = self.whiten(self.means)
+
+    def whiten(self, points):
+        """
+        L^-1 (points) for points of shape (n, pois), row by row: array of shape (n, pois).
+        """
+        if solve_triangular is not None:
+            return solve_triangular(self.cholesky, points.T, lower=True, check_finite=False).T
+        return np.linalg.solve(self.cholesky, points.T).T
+
+    def get_classes(self, ciphertexts):
+        """
+        Leakage class of every trace under every key guess: array of shape (n, 256).
+        """
+        intermediates = last_round_intermediates(ciphertexts[:, self.byte_index])
+        return LEAKAGE_MODELS[self.leakage_model][1](intermediates)
+
+    def log_likelihoods(self, samples):
+        """
+        Log-likelihood (up to a constant) of every trace under every class template: array of shape (n, classes).
+        """
+        whitened = self.whiten(samples[:, self.pois])
+        distances = (
+            (whitened ** 2).sum(axis=1)[:, np.newaxis]
+            - 2 * whitened @ self.whitened_means.T
+            + (self.whitened_means ** 2).sum(axis=1)[np.newaxis, :]
+        )
+
+        return -0.5 * distances
+
+    def save(self, path):
+        np.savez(
+            path, pois=self.pois, means=self.means, covariance=self.covariance, byte_index=self.byte_index,
+            leakage_model=self.leakage_model,
+        )
+
+    @classmethod
+    def load(cls, path):
+        stored = np.load(path)
+        return cls(
+            stored["pois"], stored["means"], stored["covariance"], int(stored["byte_index"]),
+            str(stored["leakage_model"]),
+        )
+
+
+class TemplateProfiler(object):
+    """
+    Builds a Template from a profiling dataset in two streaming passes, holding only per-class sums:
+        1. per-class sums and sums of squares of every sample -> SNR -> POIs
+        2. scatter of the POI samples around their class means -> pooled covariance
+    """
+
+    def __init__(self, byte_index, key_byte, leakage_model="hw", poi_count=10, poi_spacing=5):
+        if leakage_model not in LEAKAGE_MODELS:
+            raise ValueError("Unknown leakage model %s, expected one of %s" % (leakage_model, list(LEAKAGE_MODELS)))
+        self.byte_index = byte_index
+        self.key_byte = key_byte
+        self.leakage_model = leakage_model
+        self.poi_count = poi_count
+        self.poi_spacing = poi_spacing
+        self.classes_count = LEAKAGE_MODELS[leakage_model][0]
+
+    def get_classes(self, ciphertexts):
+        # no Hamming distance model here: InvSbox[ct ^ kb] ^ ct is not a permutation of ct, which values it can take
+        # depends on kb, so a profiling key would leave classes without a template (HW 0 and 8 for kb = 0x00)
+        intermediates = last_round_intermediates(ciphertexts[:, self.byte_index])
+        return LEAKAGE_MODELS[self.leakage_model][1](intermediates[:, self.key_byte])
+
+    def _one_hot(self, classes):
+        one_hot = np.zeros((len(classes), self.classes_count))
+        one_hot[np.arange(len(classes)), classes] = 1
+
+        return one_hot
+
+    def get_snr(self, class_sizes, class_sums, class_squares):
+        """
+        Variance of the class means over the mean of the class variances, per sample point.
+        """
+        class_means = class_sums / class_sizes[:, np.newaxis]
+        class_variances = class_squares / class_sizes[:, np.newaxis] - class_means ** 2
+        weights = class_sizes / class_sizes.sum()
+        signal = (weights[:, np.newaxis] * (class_means - weights @ class_means) ** 2).sum(axis=0)
+        noise = weights @ class_variances
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.nan_to_num(signal / noise)
+
+    def select_pois(self, snr):
+        """
+        The poi_count highest SNR sample points, at least poi_spacing apart (neighbouring samples of one peak are
+        strongly correlated and would make the covariance nearly singular).
+        """
+        pois = []
+        for sample in np.argsort(snr)[::-1]:
+            if all(abs(sample - poi) >= self.poi_spacing for poi in pois):
+                pois.append(int(sample))
+                if len(pois) == self.poi_count:
+                    break
+
+        return np.array(sorted(pois))
+
+    @instrumentation.timed("template.profile")
+    def profile(self, dataset, chunk_size=1000):
+        class_sizes = np.zeros(self.classes_count)
+        class_sums = np.zeros((self.classes_count, dataset.wlen))
+        class_squares = np.zeros((self.classes_count, dataset.wlen))
+        for ciphertexts, samples in dataset.iter_chunks(chunk_size):
+            one_hot = self._one_hot(self.get_classes(ciphertexts))
+            class_sizes += one_hot.sum(axis=0)
+            class_sums += one_hot.T @ samples
+            class_squares += one_hot.T @ samples ** 2
+
+        missing_classes = np.flatnonzero(class_sizes < 2)
+        if len(missing_classes):
+            raise ValueError("Too few profiling traces for leakage classes %s" % missing_classes.tolist())
+
+        self.snr = self.get_snr(class_sizes, class_sums, class_squares)
+        pois = self.select_pois(self.snr)
+        means = class_sums[:, pois] / class_sizes[:, np.newaxis]
+
+        scatter = np.zeros((len(pois), len(pois)))
+        for ciphertexts, samples in dataset.iter_chunks(chunk_size):
+            centered = samples[:, pois] - means[self.get_classes(ciphertexts)]
+            scatter += centered.T @ centered
+        covariance = scatter / (class_sizes.sum() - self.classes_count)
+
+        return Template(pois, means, covariance, self.byte_index, self.leakage_model)
+
+
+class TemplateAttack(object):
+    """
+    Accumulates the log-likelihood of every key guess over the attack traces, chunk by chunk.
+    """
+
+    def __init__(self, template):
+        self.template = template
+        self.scores = np.zeros(256)
+        self.traces = 0
+
+    def update(self, ciphertexts, samples):
+        with instrumentation.timer("template.score"):
+            log_likelihoods = self.template.log_likelihoods(samples)
+            classes = self.template.get_classes(ciphertexts)
+            self.scores += np.take_along_axis(log_likelihoods, classes.astype(np.intp), axis=1).sum(axis=0)
+        self.traces += len(samples)
+
+    def get_ranking(self):
+        """
+        Key guesses, most likely first.
+        """
+        return np.argsort(self.scores)[::-1]
+
+    def get_key_byte(self):
+        return int(np.argmax(self.scores))
+
+
+def run_template_attack(template, dataset, chunk_size=1000):
+    attack = TemplateAttack(template)
+    for ciphertexts, samples in dataset.iter_chunks(chunk_size):
+        attack.update(ciphertexts, samples)
+
+    return attack
+
+
+###############################################################################
+profiling_file = "PROFILING_DATA.csv"  # traces of the profiling device, captured with profiling_key_byte
+attack_file = "DATA_from_keyset_9.csv"
+profiling_key_byte = 0x00
+byte_index = 0
+number_of_attack_traces = 20
+
+
+def main():
+    profiler = TemplateProfiler(byte_index, profiling_key_byte, leakage_model="hw")
+    template = profiler.profile(TraceDataset(profiling_file))
+    print("POIs: " + str(template.pois.tolist()))
+
+    attack = run_template_attack(template, TraceDataset(attack_file, max_traces=number_of_attack_traces))
+    print("correct_key_byte=" + str(attack.get_key_byte()))
+    print("top 5 guesses: " + str(attack.get_ranking()[:5].tolist()))
+
+
+if __name__ == '__main__':
+    instrumentation.run(main)
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+Shared trace dataset access and streaming DoM / CPA engines for the AES last round attacks.
+
+Two text formats of traces are supported, one trace per row:
+    dat - whitespace separated: plaintext, ciphertext, samples... (our_dom.py)
+    csv - comma separated: ciphertext in column 1, samples in columns 10..1998 (DoM_actual_trace - Q3/Q4)
+Ciphertexts are parsed into 16 bytes, byte 0 being the most significant (first) byte of the hex string.
+"""
+
+import itertools
+import os
+
+import numpy as np
+
+from instrumentation import instrumentation
+
+CIPHERTEXT_BYTES = 16
+KEY_GUESSES = 256
+
+# format -> (delimiter, first sample column, end sample column)
+TRACE_FORMATS = {
+    "dat": (None, 2, 17),
+    "csv": (",", 10, 1999),
+}
+
+SBOX = (
+    0x63, 0x7c, 0x77, 0x7b, 0xf2, 0x6b, 0x6f, 0xc5, 0x30, 0x01, 0x67, 0x2b, 0xfe, 0xd7, 0xab, 0x76,
+    0xca, 0x82, 0xc9, 0x7d, 0xfa, 0x59, 0x47, 0xf0, 0xad, 0xd4, 0xa2, 0xaf, 0x9c, 0xa4, 0x72, 0xc0,
+    0xb7, 0xfd, 0x93, 0x26, 0x36, 0x3f, 0xf7, 0xcc, 0x34, 0xa5, 0xe5, 0xf1, 0x71, 0xd8, 0x31, 0x15,
+    0x04, 0xc7, 0x23, 0xc3, 0x18, 0x96, 0x05, 0x9a, 0x07, 0x12, 0x80, 0xe2, 0xeb, 0x27, 0xb2, 0x75,
+    0x09, 0x83, 0x2c, 0x1a, 0x1b, 0x6e, 0x5a, 0xa0, 0x52, 0x3b, 0xd6, 0xb3, 0x29, 0xe3, 0x2f, 0x84,
+    0x53, 0xd1, 0x00, 0xed, 0x20, 0xfc, 0xb1, 0x5b, 0x6a, 0xcb, 0xbe, 0x39, 0x4a, 0x4c, 0x58, 0xcf,
+    0xd0, 0xef, 0xaa, 0xfb, 0x43, 0x4d, 0x33, 0x85, 0x45, 0xf9, 0x02, 0x7f, 0x50, 0x3c, 0x9f, 0xa8,
+    0x51, 0xa3, 0x40, 0x8f, 0x92, 0x9d, 0x38, 0xf5, 0xbc, 0xb6, 0xda, 0x21, 0x10, 0xff, 0xf3, 0xd2,
+    0xcd, 0x0c, 0x13, 0xec, 0x5f, 0x97, 0x44, 0x17, 0xc4, 0xa7, 0x7e, 0x3d, 0x64, 0x5d, 0x19, 0x73,
+    0x60, 0x81, 0x4f, 0xdc, 0x22, 0x2a, 0x90, 0x88, 0x46, 0xee, 0xb8, 0x14, 0xde, 0x5e, 0x0b, 0xdb,
+    0xe0, 0x32, 0x3a, 0x0a, 0x49, 0x06, 0x24, 0x5c, 0xc2, 0xd3, 0xac, 0x62, 0x91, 0x95, 0xe4, 0x79,
+    0xe7, 0xc8, 0x37, 0x6d, 0x8d, 0xd5, 0x4e, 0xa9, 0x6c, 0x56, 0xf4, 0xea, 0x65, 0x7a, 0xae, 0x08,
+    0xba, 0x78, 0x25, 0x2e, 0x1c, 0xa6, 0xb4, 0xc6, 0xe8, 0xdd, 0x74, 0x1f, 0x4b, 0xbd, 0x8b, 0x8a,
+    0x70, 0x3e, 0xb5, 0x66, 0x48, 0x03, 0xf6, 0x0e, 0x61, 0x35, 0x57, 0xb9, 0x86, 0xc1, 0x1d, 0x9e,
+    0xe1, 0xf8, 0x98, 0x11, 0x69, 0xd9, 0x8e, 0x94, 0x9b, 0x1e, 0x87, 0xe9, 0xce, 0x55, 0x28, 0xdf,
+    0x8c, 0xa1, 0x89, 0x0d, 0xbf, 0xe6, 0x42, 0x68, 0x41, 0x99, 0x2d, 0x0f, 0xb0, 0x54, 0xbb, 0x16
+)
+
+
+INV_SBOX = (
+    0x52, 0x09, 0x6A, 0xD5, 0x30, 0x36, 0xA5, 0x38, 0xBF, 0x40, 0xA3, 0x9E, 0x81, 0xF3, 0xD7, 0xFB,
+    0x7C, 0xE3, 0x39, 0x82, 0x9B, 0x2F, 0xFF, 0x87, 0x34, 0x8E, 0x43, 0x44, 0xC4, 0xDE, 0xE9, 0xCB,
+    0x54, 0x7B, 0x94, 0x32, 0xA6, 0xC2, 0x23, 0x3D, 0xEE, 0x4C, 0x95, 0x0B, 0x42, 0xFA, 0xC3, 0x4E,
+    0x08, 0x2E, 0xA1, 0x66, 0x28, 0xD9, 0x24, 0xB2, 0x76, 0x5B, 0xA2, 0x49, 0x6D, 0x8B, 0xD1, 0x25,
+    0x72, 0xF8, 0xF6, 0x64, 0x86, 0x68, 0x98, 0x16, 0xD4, 0xA4, 0x5C, 0xCC, 0x5D, 0x65, 0xB6, 0x92,
+    0x6C, 0x70, 0x48, 0x50, 0xFD, 0xED, 0xB9, 0xDA, 0x5E, 0x15, 0x46, 0x57, 0xA7, 0x8D, 0x9D, 0x84,
+    0x90, 0xD8, 0xAB, 0x00, 0x8C, 0xBC, 0xD3, 0x0A, 0xF7, 0xE4, 0x58, 0x05, 0xB8, 0xB3, 0x45, 0x06,
+    0xD0, 0x2C, 0x1E, 0x8F, 0xCA, 0x3F, 0x0F, 0x02, 0xC1, 0xAF, 0xBD, 0x03, 0x01, 0x13, 0x8A, 0x6B,
+    0x3A, 0x91, 0x11, 0x41, 0x4F, 0x67, 0xDC, 0xEA, 0x97, 0xF2, 0xCF, 0xCE, 0xF0, 0xB4, 0xE6, 0x73,
+    0x96, 0xAC, 0x74, 0x22, 0xE7, 0xAD, 0x35, 0x85, 0xE2, 0xF9, 0x37, 0xE8, 0x1C, 0x75, 0xDF, 0x6E,
+    0x47, 0xF1, 0x1A, 0x71, 0x1D, 0x29, 0xC5, 0x89, 0x6F, 0xB7, 0x62, 0x0E, 0xAA, 0x18, 0xBE, 0x1B,
+    0xFC, 0x56, 0x3E, 0x4B, 0xC6, 0xD2, 0x79, 0x20, 0x9A, 0xDB, 0xC0, 0xFE, 0x78, 0xCD, 0x5A, 0xF4,
+    0x1F, 0xDD, 0xA8, 0x33, 0x88, 0x07, 0xC7, 0x31, 0xB1, 0x12, 0x10, 0x59, 0x27, 0x80, 0xEC, 0x5F,
+    0x60, 0x51, 0x7F, 0xA9, 0x19, 0xB5, 0x4A, 0x0D, 0x2D, 0xE5, 0x7A, 0x9F, 0x93, 0xC9, 0x9C, 0xEF,
+    0xA0, 0xE0, 0x3B, 0x4D, 0xAE, 0x2A, 0xF5, 0xB0, 0xC8, 0xEB, 0xBB, 0x3C, 0x83, 0x53, 0x99, 0x61,
+    0x17, 0x2B, 0x04, 0x7E, 0xBA, 0x77, 0xD6, 0x26, 0xE1, 0x69, 0x14, 0x63, 0x55, 0x21, 0x0C, 0x7D,
+)
+
+HAMMING_WEIGHT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def calculate_inverse_sbox(sbox=SBOX):
+    inverse_sbox = [0] * 256
+    for i in range(256):
+        inverse_sbox[sbox[i]] = i
+
+    return inverse_sbox
+
+
+def detect_trace_format(path):
+    """
+    A file whose first trace row contains a comma is a csv dataset, otherwise a whitespace separated dat one.
+    """
+    with open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                return "csv" if "," in line else "dat"
+
+    raise ValueError("%s holds no traces" % path)
+
+
+class TraceDataset(object):
+    """
+    Lazy view of a trace file. Nothing is read until iterated, and iter_chunks() holds only chunk_size traces in
+    memory at once, so datasets larger than RAM can be processed.
+    """
+
+    def __init__(self, path, trace_format=None, wstart=None, wstop=None, max_traces=None):
+        self.path = path
+        self.trace_format = trace_format if trace_format is not None else detect_trace_format(path)
+        if self.trace_format not in TRACE_FORMATS:
+            raise ValueError("Unknown trace format %s, expected one of %s" % (self.trace_format, list(TRACE_FORMATS)))
+        self.delimiter, default_wstart, default_wstop = TRACE_FORMATS[self.trace_format]
+        self.wstart = wstart if wstart is not None else default_wstart
+        self.wstop = wstop if wstop is not None else default_wstop
+        self.wlen = self.wstop - self.wstart
+        self.max_traces = max_traces
+
+    def count_traces(self):
+        """
+        Number of traces iter_chunks() yields, counted without parsing them.
+        """
+        with open(self.path, 'r') as f:
+            return sum(1 for _ in itertools.islice((line for line in f if line.strip()), self.max_traces))
+
+    def _rows(self):
+        with open(self.path, 'r') as f:
+            rows = (line.split(self.delimiter) for line in f if line.strip())
+            yield from itertools.islice(rows, self.max_traces)
+
+    def _parse_chunk(self, rows):
+        ciphertexts = b"".join(int(row[1], 16).to_bytes(CIPHERTEXT_BYTES, "big") for row in rows)
+        ciphertexts = np.frombuffer(ciphertexts, dtype=np.uint8).reshape(len(rows), CIPHERTEXT_BYTES)
+        samples = np.array([row[self.wstart:self.wstop] for row in rows], dtype=float).reshape(len(rows), -1)
+
+        return ciphertexts, samples
+
+    def iter_chunks(self, chunk_size=1000):
+        """
+        Yields (ciphertexts, samples) blocks: uint8 array of shape (n, 16) and float array of shape (n, wlen),
+        with n <= chunk_size.
+        """
+        rows = self._rows()
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                return
+            with instrumentation.timer("trace_dataset.parse"):
+                parsed_chunk = self._parse_chunk(chunk)
+            instrumentation.count("trace_dataset.traces", len(chunk))
+            yield parsed_chunk
+
+    def __iter__(self):
+        return self.iter_chunks()
+
+
+class ArrayTraceDataset(object):
+    """
+    Traces held in two .npy files, ciphertexts.npy (uint8, (n, 16)) and samples.npy (float, (n, wlen)), memory
+    mapped: every pass over them reads the binary samples instead of parsing text, and only the chunks being used
+    are paged in. Same iter_chunks() interface as TraceDataset.
+    """
+
+    CIPHERTEXTS_FILE = "ciphertexts.npy"
+    SAMPLES_FILE = "samples.npy"
+
+    def __init__(self, directory):
+        self.path = directory
+        self.ciphertexts = np.load(os.path.join(directory, self.CIPHERTEXTS_FILE), mmap_mode='r')
+        self.samples = np.load(os.path.join(directory, self.SAMPLES_FILE), mmap_mode='r')
+        self.wlen = self.samples.shape[1]
+
+    @classmethod
+    def from_dataset(cls, dataset, directory, chunk_size=1000):
+        """
+        Converts dataset (parsed once, chunk by chunk) into the .npy files of directory.
+        """
+        traces = dataset.count_traces()
+        ciphertexts = np.lib.format.open_memmap(os.path.join(directory, cls.CIPHERTEXTS_FILE), mode="w+",
+                                                dtype=np.uint8, shape=(traces, CIPHERTEXT_BYTES))
+        samples = np.lib.format.open_memmap(os.path.join(directory, cls.SAMPLES_FILE), mode="w+",
+                                            dtype=float, shape=(traces, dataset.wlen))
+        start = 0
+        for chunk_ciphertexts, chunk_samples in dataset.iter_chunks(chunk_size):
+            ciphertexts[start:start + len(chunk_samples)] = chunk_ciphertexts
+            samples[start:start + len(chunk_samples)] = chunk_samples
+            start += len(chunk_samples)
+        ciphertexts.flush()
+        samples.flush()
+        del ciphertexts, samples
+
+        return cls(directory)
+
+    def count_traces(self):
+        return len(self.samples)
+
+    def iter_chunks(self, chunk_size=1000):
+        for start in range(0, len(self.samples), chunk_size):
+            stop = start + chunk_size
+            yield np.asarray(self.ciphertexts[start:stop]), np.asarray(self.samples[start:stop])
+
+    def __iter__(self):
+        return self.iter_chunks()
+
+
+def last_round_intermediates(ciphertext_bytes, hamming_distance=False):
+    """
+    InvSbox[ct ^ kb] for every key guess kb: array of shape (n, 256). With hamming_distance the value is xored
+    with the ciphertext byte again, i.e. the distance between the last round input and output registers.
+    """
+    ciphertext_bytes = np.asarray(ciphertext_bytes, dtype=np.uint8)[:, np.newaxis]
+    key_guesses = np.arange(KEY_GUESSES, dtype=np.uint8)[np.newaxis, :]
+    intermediates = np.asarray(INV_SBOX, dtype=np.uint8)[ciphertext_bytes ^ key_guesses]
+    if hamming_distance:
+        intermediates ^= ciphertext_bytes
+
+    return intermediates
+
+
+class DomEngine(object):
+    """
+    Difference of means for all 256 guesses of one key byte, accumulated chunk by chunk in fixed memory.
+    Traces are split by bit selection_bit of the last round intermediate value.
+    """
+
+    def __init__(self, wlen, byte_index, hamming_distance=False, selection_bit=7):
+        self.byte_index = byte_index
+        self.hamming_distance = hamming_distance
+        self.selection_bit = selection_bit
+        self.bin_sum = np.zeros((KEY_GUESSES, wlen))     # sum of the traces whose selection bit is 1
+        self.bin_size = np.zeros(KEY_GUESSES)
+        self.total_sum = np.zeros(wlen)
+        self.total_size = 0
+
+    def get_hypotheses(self, ciphertexts):
+        """
+        Selection bit of every trace under every key guess: float array of shape (n, 256).
+        """
+        intermediates = last_round_intermediates(ciphertexts[:, self.byte_index], self.hamming_distance)
+        return ((intermediates >> self.selection_bit) & 1).astype(float)
+
+    def update(self, ciphertexts, samples, hypotheses=None):
+        """
+        hypotheses: get_hypotheses(ciphertexts), when the caller already has them.
+        """
+        with instrumentation.timer("dom.hypotheses"):
+            selection = hypotheses if hypotheses is not None else self.get_hypotheses(ciphertexts)
+        with instrumentation.timer("dom.accumulate"):
+            self.bin_sum += selection.T @ samples
+            self.bin_size += selection.sum(axis=0)
+            self.total_sum += samples.sum(axis=0)
+            self.total_size += len(samples)
+
+    def get_dom(self):
+        """
+        |mean(bin 1) - mean(bin 0)| per guess and sample: array of shape (256, wlen).
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean_1 = self.bin_sum / self.bin_size[:, np.newaxis]
+            mean_0 = (self.total_sum - self.bin_sum) / (self.total_size - self.bin_size)[:, np.newaxis]
+            return np.nan_to_num(np.abs(mean_1 - mean_0))
+
+    @instrumentation.timed("dom.rank")
+    def get_key_byte(self):
+        return int(np.argmax(self.get_dom().max(axis=1)))
+
+
+class CpaEngine(object):
+    """
+    Pearson correlation between the Hamming weight of the last round intermediate value and every sample, for all
+    256 guesses of one key byte. Only running sums are kept, so memory does not grow with the number of traces.
+    """
+
+    def __init__(self, wlen, byte_index, hamming_distance=False):
+        self.byte_index = byte_index
+        self.hamming_distance = hamming_distance
+        self.traces = 0
+        self.sum_h = np.zeros(KEY_GUESSES)
+        self.sum_h2 = np.zeros(KEY_GUESSES)
+        self.sum_x = np.zeros(wlen)
+        self.sum_x2 = np.zeros(wlen)
+        self.sum_hx = np.zeros((KEY_GUESSES, wlen))
+
+    def get_hypotheses(self, ciphertexts):
+        """
+        Hamming weight of the intermediate value of every trace under every key guess: float array of shape (n, 256).
+        """
+        intermediates = last_round_intermediates(ciphertexts[:, self.byte_index], self.hamming_distance)
+        return HAMMING_WEIGHT[intermediates].astype(float)
+
+    def update(self, ciphertexts, samples, hypotheses=None):
+        """
+        hypotheses: get_hypotheses(ciphertexts), when the caller already has them.
+        """
+        with instrumentation.timer("cpa.hypotheses"):
+            if hypotheses is None:
+                hypotheses = self.get_hypotheses(ciphertexts)
+        with instrumentation.timer("cpa.accumulate"):
+            self.traces += len(samples)
+            self.sum_h += hypotheses.sum(axis=0)
+            self.sum_h2 += (hypotheses ** 2).sum(axis=0)
+            self.sum_x += samples.sum(axis=0)
+            self.sum_x2 += (samples ** 2).sum(axis=0)
+            self.sum_hx += hypotheses.T @ samples
+
+    def get_correlation(self):
+        """
+        Correlation per guess and sample: array of shape (256, wlen).
+        """
+        n = self.traces
+        covariance = n * self.sum_hx - np.outer(self.sum_h, self.sum_x)
+        variance_h = n * self.sum_h2 - self.sum_h ** 2
+        variance_x = n * self.sum_x2 - self.sum_x ** 2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.nan_to_num(covariance / np.sqrt(np.outer(variance_h, variance_x)))
+
+    @instrumentation.timed("cpa.rank")
+    def get_key_byte(self):
+        return int(np.argmax(np.abs(self.get_correlation()).max(axis=1)))
+
+
+def run_engines(dataset, engines, chunk_size=1000):
+    """
+    Feeds every chunk of dataset to all engines, so several key bytes / distinguishers share one pass over the file.
+    """
+    for ciphertexts, samples in dataset.iter_chunks(chunk_size):
+        for engine in engines:
+            engine.update(ciphertexts, samples)
+
+    return engines